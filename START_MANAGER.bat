@@ -2,6 +2,16 @@
 title Scaffolding Business Manager
 color 0A
 
+REM Server settings
+REM   SERVER_MODE: production (multi-threaded waitress server) or dev (Flask development server)
+REM   HOST: 127.0.0.1 for this PC only, 0.0.0.0 to let other office PCs connect
+set SERVER_MODE=production
+set HOST=127.0.0.1
+set PORT=5000
+set THREADS=8
+set CONNECTION_LIMIT=100
+set TIMEOUT=120
+
 echo ============================================================
 echo       SCAFFOLDING BUSINESS MANAGER - Ultimate Edition
 echo ============================================================
@@ -25,7 +35,7 @@ if errorlevel 1 (
 
 REM Install required packages
 echo Installing/Checking required packages...
-pip install Flask Flask-CORS --quiet
+pip install Flask Flask-CORS waitress --quiet
 if errorlevel 1 (
     echo [WARNING] Some packages may not have been installed correctly
 )
@@ -43,6 +53,6 @@ echo ============================================================
 echo.
 
 REM Run the Python server
-python scaffolding_manager.py
+python scaffolding_manager.py --server %SERVER_MODE% --host %HOST% --port %PORT% --threads %THREADS% --connection-limit %CONNECTION_LIMIT% --timeout %TIMEOUT%
 
 pause
@@ -5,7 +5,7 @@ a = Analysis(
     ['scaffolding_manager.py'],
     pathex=[],
     binaries=[],
-    datas=[('complete_scaffolding_dashboard.html', '.')],
+    datas=[('complete_scaffolding_dashboard.html', '.'), ('templates', 'templates'), ('static', 'static'), ('data', 'data')],
     hiddenimports=[],
     hookspath=[],
     hooksconfig={},
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+Scaffolding Business Manager - Performance Benchmarks
+Runs against a throwaway database in a temporary home folder, never your real data
+
+Usage:
+    python benchmark.py json [--rows N]
+    python benchmark.py receipts [--concurrency N]
+    python benchmark.py server [--rows N] [--concurrency N]
+    python benchmark.py import [--rows N]
+    python benchmark.py dates [--rows N]
+"""
+
+import os
+import time
+import random
+import sqlite3
+import tempfile
+import logging
+import argparse
+import threading
+import urllib.request
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+# Point the app at a temporary home folder before it is imported
+BENCH_HOME = tempfile.mkdtemp(prefix='scaffolding_bench_')
+os.environ['HOME'] = BENCH_HOME
+os.environ['USERPROFILE'] = BENCH_HOME
+
+import scaffolding_manager as sm
+import fixed_job_importer as importer
+from flask.json.provider import DefaultJSONProvider
+
+AREAS = ['Peterborough', 'Leicester', 'London', 'Birmingham', 'Luton', 'Builders', 'Unassigned']
+STATUSES = ['pending', 'active', 'completed']
+
+def print_header(title):
+    """Print a formatted section header"""
+    print("\n" + "=" * 70)
+    print(f"  {title}")
+    print("=" * 70)
+
+def timed(func, repeat=5):
+    """Best wall-clock time of func over several runs, in milliseconds"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def seed_jobs(count):
+    """Insert count realistic-looking jobs into the benchmark database"""
+    rng = random.Random(42)
+    first_day = date(2022, 1, 1)
+    rows = []
+    for i in range(count):
+        start = first_day + timedelta(days=rng.randrange(1500))
+        area = rng.choice(AREAS)
+        rows.append((
+            f'BM{i:07d}', f'Client at {rng.randrange(1, 300)} High Street, {area}...',
+            f'{rng.randrange(1, 300)} High Street, {area} PE{rng.randrange(1, 9)} {rng.randrange(1, 9)}AB',
+            area, rng.choice(['u shape', 'front back', 'chimney', 'full wrap']),
+            f'Truck {rng.randrange(1, 4)}', rng.choice(['Karan', 'Raj', 'Amrit', '']),
+            start.isoformat(), (start + timedelta(weeks=rng.randrange(1, 8))).isoformat(),
+            rng.choice(STATUSES), float(rng.randrange(400, 3000)),
+            f'Fitter: {rng.choice(["Karan", "Raj"])} | Postcode: PE{rng.randrange(1, 9)}'
+        ))
+    with sm.db_connection() as conn:
+        conn.executemany('''
+            INSERT INTO jobs (jobNumber, clientName, location, area, jobType, truck, driver,
+                              startDate, endDate, status, value, notes)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        conn.commit()
+
+def bench_json(args):
+    """Jobs list: previous jsonify path vs the fast serializer and compression"""
+    print_header(f"JSON SERIALIZATION - /api/jobs with {args.rows:,} jobs")
+    seed_jobs(args.rows)
+    client = sm.app.test_client()
+
+    with sm.db_connection() as conn:
+        jobs = [dict(row) for row in conn.execute('SELECT * FROM jobs ORDER BY createdAt DESC')]
+
+    with sm.app.app_context():
+        stdlib = DefaultJSONProvider(sm.app)
+        fast = sm.app.json
+        previous_ms = timed(lambda: stdlib.response(jobs).get_data())
+        fast_ms = timed(lambda: fast.response(jobs).get_data())
+        body = fast.response(jobs).get_data()
+
+    encoder = 'orjson' if sm.orjson is not None else 'stdlib fallback'
+    print(f"📦 Body size: {len(body) / 1024:,.0f} KB")
+    print(f"   • Previous jsonify (sorted keys, stdlib): {previous_ms:8.1f} ms")
+    print(f"   • Fast provider ({encoder}):{' ' * max(1, 17 - len(encoder))}{fast_ms:8.1f} ms"
+          f"  ({previous_ms / fast_ms:.1f}x)")
+
+    print("\n🌐 Full request through the app:")
+    for label, headers in (('identity', {}), ('gzip', {'Accept-Encoding': 'gzip'})):
+        response = client.get('/api/jobs', headers=headers)
+        ms = timed(lambda: client.get('/api/jobs', headers=headers).get_data())
+        print(f"   • {label:9} {ms:8.1f} ms  {len(response.get_data()) / 1024:8,.0f} KB on the wire")
+
+    etag = client.get('/api/jobs').headers['ETag']
+    ms = timed(lambda: client.get('/api/jobs', headers={'If-None-Match': etag}))
+    print(f"   • 304 revalidation {ms:6.2f} ms")
+
+def serve_in_background():
+    """Run the app on a free local port in a background thread; returns (base_url, server)"""
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)  # no per-request log lines
+    logging.getLogger('waitress').setLevel(logging.ERROR)  # nor queue-depth warnings
+    server = make_server('127.0.0.1', 0, sm.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}', server
+
+def fetch(url, headers):
+    """GET url and return (status, body length); 304s come back as HTTPError"""
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers)) as response:
+            return response.status, len(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, 0
+
+def fetch_concurrently(requests, concurrency):
+    """Fetch (url, headers) pairs on a thread pool; returns (seconds, statuses, bytes)"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda req: fetch(*req), requests))
+    elapsed = time.perf_counter() - start
+    return elapsed, {status for status, _ in results}, sum(size for _, size in results)
+
+RECEIPT_FILES = 32
+RECEIPT_SIZE = 1024 * 1024
+RECEIPT_FETCHES = 256
+
+def bench_receipts(args):
+    """Concurrent receipt fetches: full downloads, 304 revalidations and Range reads"""
+    print_header(f"RECEIPT SERVING - {RECEIPT_FETCHES} fetches of {RECEIPT_FILES} x "
+                 f"{RECEIPT_SIZE // 1024} KB PDFs, {args.concurrency} concurrent clients")
+    with sm.db_connection() as conn:
+        paths = []
+        for i in range(RECEIPT_FILES):
+            path = sm._store_receipt_file(BytesIO(os.urandom(RECEIPT_SIZE)), 'pdf')
+            conn.execute('''
+                INSERT INTO transactions (transactionType, category, amount, date, description, receiptPath)
+                VALUES ('out', 'fuel', 10, '2024-01-01', ?, ?)
+            ''', (f'Receipt {i}', path))
+            paths.append(path)
+        conn.commit()
+
+    base_url, server = serve_in_background()
+    try:
+        urls = [f'{base_url}/api/transactions/receipts/{paths[i % len(paths)]}'
+                for i in range(RECEIPT_FETCHES)]
+        etags = {path: f'"{path.rsplit(".", 1)[0]}"' for path in paths}
+        modes = [
+            ('full download', [(url, {}) for url in urls]),
+            ('304 revalidate', [(url, {'If-None-Match': etags[url.rsplit('/', 1)[1]]}) for url in urls]),
+            ('first 64 KB range', [(url, {'Range': 'bytes=0-65535'}) for url in urls]),
+        ]
+        for label, requests in modes:
+            fetch_concurrently(requests[:args.concurrency], args.concurrency)  # warm up
+            elapsed, statuses, size = fetch_concurrently(requests, args.concurrency)
+            print(f"   • {label:18} {RECEIPT_FETCHES / elapsed:8.0f} req/s  "
+                  f"{size / elapsed / 1024 / 1024:8.1f} MB/s  status {sorted(statuses)}")
+    finally:
+        server.shutdown()
+
+SERVER_FETCHES = 2000
+SERVER_PATHS = ['/api/jobs?limit=100', '/api/financial-summary?year=2024', '/api/vehicles',
+                '/api/invoices', '/api/changes']  # the mix a dashboard poll makes
+
+def bench_server(args):
+    """Request throughput: Flask development server vs the production waitress server"""
+    print_header(f"SERVER THROUGHPUT - {SERVER_FETCHES} API requests, {args.concurrency} concurrent clients")
+    seed_jobs(args.rows)
+    servers = []
+
+    base_url, dev = serve_in_background()
+    servers.append(('dev (werkzeug)', base_url, dev.shutdown))
+    try:
+        production = sm.create_production_server(port=0, threads=args.concurrency)
+    except ImportError:
+        print("⚠️ waitress is not installed (pip install waitress); only the dev server is measured")
+    else:
+        threading.Thread(target=production.run, daemon=True).start()
+        servers.append(('production (waitress)', f'http://127.0.0.1:{production.effective_port}',
+                        production.close))
+
+    results = {}
+    try:
+        for label, base_url, _ in servers:
+            requests = [(base_url + SERVER_PATHS[i % len(SERVER_PATHS)], {'Accept-Encoding': 'gzip'})
+                        for i in range(SERVER_FETCHES)]
+            fetch_concurrently(requests[:args.concurrency * 4], args.concurrency)  # warm up
+            elapsed, statuses, _ = fetch_concurrently(requests, args.concurrency)
+            results[label] = SERVER_FETCHES / elapsed
+            print(f"   • {label:22} {results[label]:8.0f} req/s  status {sorted(statuses)}")
+    finally:
+        for _, _, stop in servers:
+            stop()
+
+    if len(results) == 2:
+        dev_rate, production_rate = results.values()
+        print(f"\n🏭 Production server: {production_rate / dev_rate:.1f}x the development server")
+
+def parsed_jobs(count, price_bump=0):
+    """count jobs shaped like the CSV parsers' output; every price_bump-th job is dearer"""
+    rng = random.Random(7)
+    first_day = date(2022, 1, 1)
+    for i in range(count):
+        area = rng.choice(AREAS)
+        price = float(rng.randrange(400, 3000))
+        if price_bump and i % price_bump == 0:
+            price += 100
+        yield {
+            'date': (first_day + timedelta(days=i % 1500)).isoformat(),
+            'address': f'{i} High Street, {area} PE{rng.randrange(1, 9)} {rng.randrange(1, 9)}AB',
+            'area': area, 'jobType': rng.choice(['u shape', 'front back', 'chimney']),
+            'truck': f'Truck {rng.randrange(1, 4)}', 'driver': rng.choice(['Karan', 'Raj', '']),
+            'fitter': rng.choice(['Karan', 'Raj']), 'finishDate': None,
+            'status': rng.choice(STATUSES), 'price': price,
+        }
+
+def previous_write_jobs(db_path, jobs, chunk_size=importer.IMPORT_CHUNK_SIZE):
+    """The importer's previous writer: per chunk, one SELECT of stored keys, then an
+    UPDATE or INSERT per job and a commit; returns (inserted, updated)"""
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    inserted, updated = 0, 0
+    index = importer.next_job_index(conn)
+    try:
+        for chunk in importer.chunked(jobs, chunk_size):
+            merged = importer.merge_jobs(chunk)
+            dates = sorted({job['date'] for job in merged})
+            cursor.execute(f"SELECT jobNumber, location, startDate FROM jobs "
+                           f"WHERE startDate IN ({','.join('?' * len(dates))})", dates)
+            existing = {importer.create_job_key({'date': row[2], 'address': row[1] or ''}): row[0]
+                        for row in cursor.fetchall()}
+            for job in merged:
+                notes = importer.job_notes(job)
+                job_number = existing.get(importer.create_job_key(job))
+                if job_number:
+                    cursor.execute('''
+                        UPDATE jobs
+                        SET truck = COALESCE(NULLIF(?, ''), truck),
+                            driver = COALESCE(NULLIF(?, ''), driver),
+                            area = ?,
+                            endDate = COALESCE(?, endDate),
+                            value = CASE WHEN ? > COALESCE(value, 0) THEN ? ELSE value END,
+                            notes = COALESCE(?, notes),
+                            status = CASE WHEN ? != 'pending' THEN ? ELSE status END,
+                            updatedAt = CURRENT_TIMESTAMP
+                        WHERE jobNumber = ?
+                    ''', (job.get('truck', ''), job.get('driver', ''), job['area'], job.get('finishDate'),
+                          job['price'], job['price'], notes, job['status'], job['status'], job_number))
+                    updated += 1
+                else:
+                    cursor.execute('''
+                        INSERT INTO jobs (jobNumber, clientName, location, area, jobType, truck, driver,
+                                          startDate, endDate, status, value, notes)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', (f"{importer.job_number_prefix(job['area'])}{index + 10000:06d}",
+                          f"Client at {job['address'][:40]}...", job['address'], job['area'], job['jobType'],
+                          job.get('truck', ''), job.get('driver', ''), job['date'], job.get('finishDate'),
+                          job['status'], job['price'], notes))
+                    inserted += 1
+                index += 1
+            conn.commit()
+    finally:
+        conn.close()
+    return inserted, updated
+
+def bench_import(args):
+    """Bulk job import: previous per-row writer vs the staging table upsert, on the same jobs"""
+    print_header(f"JOB IMPORT - {args.rows:,} parsed jobs, previous per-row writer vs staging + UPSERT")
+    baseline_path = os.path.join(BENCH_HOME, 'baseline.db')
+    baseline = sqlite3.connect(baseline_path)
+    with sm.db_connection() as conn:
+        conn.backup(baseline)  # same empty schema and triggers for both writers
+    baseline.close()
+    runs = [
+        ('fresh import', lambda: parsed_jobs(args.rows)),
+        ('re-import, no changes', lambda: parsed_jobs(args.rows)),
+        ('re-import, 10% dearer', lambda: parsed_jobs(args.rows, price_bump=10)),
+    ]
+    for label, jobs in runs:
+        print(f"\n📥 {label}:")
+        start = time.perf_counter()
+        inserted, updated = previous_write_jobs(baseline_path, jobs())
+        previous_s = time.perf_counter() - start
+        print(f"   • {'previous per-row writer':24} {previous_s:6.2f} s  {args.rows / previous_s:9,.0f} jobs/s  "
+              f"inserted {inserted:,}  updated {updated:,}")
+        start = time.perf_counter()
+        inserted, updated, unchanged = importer.write_jobs(jobs())
+        bulk_s = time.perf_counter() - start
+        print(f"   • {'staging + UPSERT':24} {bulk_s:6.2f} s  {args.rows / bulk_s:9,.0f} jobs/s  "
+              f"inserted {inserted:,}  updated {updated:,}  unchanged {unchanged:,}  "
+              f"({previous_s / bulk_s:.1f}x)")
+
+PREVIOUS_DATE_FORMATS = ['%m/%d/%Y', '%d/%m/%Y', '%m-%d-%Y', '%d-%m-%Y', '%Y-%m-%d']
+
+def previous_parse_date(value):
+    """The importer's previous per-value parse: first of five formats that fits"""
+    for fmt in PREVIOUS_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return None
+
+def bench_dates(args):
+    """CSV date parsing: per-value format search vs an inferred column format with a cache"""
+    print_header(f"DATE PARSING - {args.rows:,} values per column")
+    rng = random.Random(3)
+    days = [date(2022, 1, 1) + timedelta(days=rng.randrange(1500)) for _ in range(args.rows)]
+    columns = [
+        ('month-first column', [f'{d.month}/{d.day}/{d.year}' for d in days]),
+        ('day-first (UK) column', [f'{d.day:02d}/{d.month:02d}/{d.year}' for d in days]),
+    ]
+    expected = [d.isoformat() for d in days]
+    for label, values in columns:
+        print(f"\n🗓️ {label}:")
+        start = time.perf_counter()
+        previous = [previous_parse_date(value) for value in values]
+        previous_s = time.perf_counter() - start
+        
+        importer.parse_date.cache_clear()
+        start = time.perf_counter()
+        date_format, alternative = importer.infer_date_format(values[:importer.DATE_SAMPLE_ROWS])
+        problems = []
+        formats = {'start': (date_format, alternative)}
+        inferred = [importer.read_date(value, 'start', formats, problems) for value in values]
+        inferred_s = time.perf_counter() - start
+        
+        for name, seconds, parsed in (('previous format search', previous_s, previous),
+                                      (f'inferred {date_format} + LRU cache', inferred_s, inferred)):
+            misread = sum(1 for got, want in zip(parsed, expected) if got != want)
+            print(f"   • {name:34} {seconds:6.2f} s  {args.rows / seconds:11,.0f} values/s  "
+                  f"misread {misread:,}")
+        print(f"   • cache: {importer.parse_date.cache_info().hits:,} hits, "
+              f"{len(problems):,} values for the rejects report")
+
+BENCHMARKS = {
+    'json': bench_json,
+    'receipts': bench_receipts,
+    'server': bench_server,
+    'import': bench_import,
+    'dates': bench_dates,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description='Scaffolding Manager performance benchmarks')
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--rows', type=int, default=20000, help='rows to seed (default 20000)')
+    parser.add_argument('--concurrency', type=int, default=8, help='concurrent clients (default 8)')
+    args = parser.parse_args()
+
+    sm.init_database()
+    try:
+        BENCHMARKS[args.benchmark](args)
+    finally:
+        sm.close_all_connections()
+    print()
+
+if __name__ == '__main__':
+    main()
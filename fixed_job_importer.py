@@ -7,95 +7,71 @@ Imports jobs from CSV files and assigns to correct area based on postcode
 import sqlite3
 import os
 import csv
-import re
 from datetime import datetime
-from collections import defaultdict
+from collections import defaultdict, deque
+from functools import lru_cache
+from itertools import chain, islice
+from concurrent.futures import ProcessPoolExecutor
+from postcodes import extract_postcode, area_for_address
 
 DB_PATH = os.path.join(os.path.expanduser('~'), 'scaffolding_business.db')
+REJECTS_REPORT_PATH = os.path.join(os.path.expanduser('~'), 'scaffolding_import_rejects.csv')
 
-# Postcode prefixes for each area
-POSTCODE_AREAS = {
-    'Peterborough': ['PE'],
-    'Leicester': ['LE'],
-    'London': ['N', 'NW', 'W', 'SW', 'SE', 'E', 'EC', 'WC'],
-    'Birmingham': ['B', 'CV', 'DY', 'WS', 'WV'],
-    'Luton': ['LU'],
+# Date formats a column may be in. Day-first precedes month-first, so a column whose
+# sample fits both equally (no day above 12) is read the UK way.
+DATE_FORMATS = [
+    '%d/%m/%Y', '%m/%d/%Y', '%d-%m-%Y', '%m-%d-%Y', '%Y-%m-%d',
+    '%d/%m/%y', '%m/%d/%y', '%d-%b-%Y', '%d-%b-%y', '%d %b %Y',
+]
+SWAPPED_DATE_FORMATS = {
+    '%d/%m/%Y': '%m/%d/%Y', '%d-%m-%Y': '%m-%d-%Y', '%d/%m/%y': '%m/%d/%y',
 }
+DATE_SAMPLE_ROWS = 500  # rows read from the top of each file to infer its date formats
+DATE_CACHE_SIZE = 4096  # a column repeats the same few hundred dates
 
-def extract_postcode(address):
-    """Extract UK postcode from address"""
-    # UK postcode pattern
-    pattern = r'\b([A-Z]{1,2}\d{1,2}[A-Z]?\s?\d[A-Z]{2})\b'
-    match = re.search(pattern, address.upper())
-    if match:
-        return match.group(1).replace(' ', '')
-    return None
+@lru_cache(maxsize=DATE_CACHE_SIZE)
+def parse_date(value, date_format):
+    """value read with date_format as YYYY-MM-DD, or None if it doesn't fit"""
+    try:
+        return datetime.strptime(value, date_format).date().isoformat()
+    except ValueError:
+        return None
 
-def get_area_from_postcode(postcode):
-    """Determine area from postcode"""
-    if not postcode:
-        return 'Unassigned'
-    
-    # Extract postcode prefix (letters only)
-    prefix_match = re.match(r'^([A-Z]+)', postcode.upper())
-    if not prefix_match:
-        return 'Unassigned'
-    
-    prefix = prefix_match.group(1)
-    
-    # Check each area
-    for area, prefixes in POSTCODE_AREAS.items():
-        if prefix in prefixes:
-            return area
-    
-    return 'Unassigned'
+def infer_date_format(values):
+    """(format, alternative) for a column from a sample of its values
+
+    format is the DATE_FORMATS entry that reads the most values (None if none
+    do). alternative is the month/day-swapped format when the sample could not
+    tell the two apart, so values that read differently can be flagged.
+    """
+    values = [value.strip() for value in values if value and value.strip() not in ('', '0')]
+    counts = {fmt: sum(1 for value in values if parse_date(value, fmt)) for fmt in DATE_FORMATS}
+    best = max(DATE_FORMATS, key=lambda fmt: counts[fmt])  # first wins a tie
+    if not counts[best]:
+        return None, None
+    swapped = SWAPPED_DATE_FORMATS.get(best)
+    return best, swapped if swapped and counts[swapped] == counts[best] else None
+
+def read_date(value, column, formats, problems):
+    """Parse one date cell with its column's inferred format
 
-def parse_date(date_str):
-    """Parse various date formats to YYYY-MM-DD"""
-    if not date_str or date_str == '0' or not date_str.strip():
+    Empty cells give None. Cells that don't fit, or that would read differently
+    with day and month swapped in a column that never showed which comes first,
+    are recorded in problems as (column, value, reason).
+    """
+    value = value.strip()
+    if not value or value == '0':
         return None
-    
-    date_str = date_str.strip()
-    
-    # Try various date formats
-    formats = [
-        '%m/%d/%Y', '%d/%m/%Y', '%m-%d-%Y', '%d-%m-%Y', '%Y-%m-%d',
-    ]
-    
-    for fmt in formats:
-        try:
-            date_obj = datetime.strptime(date_str, fmt)
-            return date_obj.strftime('%Y-%m-%d')
-        except:
-            continue
-    
-    # Handle "26-Nov" format
-    try:
-        if '-' in date_str and len(date_str.split('-')) == 2:
-            parts = date_str.split('-')
-            if parts[1].isalpha():
-                month_map = {'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
-                           'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12}
-                day = int(parts[0])
-                month = month_map.get(parts[1].lower()[:3], 11)
-                return f"2024-{month:02d}-{day:02d}"
-    except:
-        pass
-    
-    # Handle "Apr-25" format
-    try:
-        if '-' in date_str:
-            parts = date_str.split('-')
-            if parts[0].isalpha() and len(parts[1]) == 2:
-                month_map = {'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
-                           'jul': 7, 'aug': 8, 'sep': 9, 'oct': 10, 'nov': 11, 'dec': 12}
-                month = month_map.get(parts[0].lower()[:3], 4)
-                year = 2000 + int(parts[1])
-                return f"{year}-{month:02d}-01"
-    except:
-        pass
-    
-    return None
+    date_format, alternative = formats[column]
+    if date_format is None:
+        problems.append((column, value, 'no recognisable dates in this column'))
+        return None
+    parsed = parse_date(value, date_format)
+    if parsed is None:
+        problems.append((column, value, f'does not match the column format {date_format}'))
+    elif alternative and parse_date(value, alternative) not in (None, parsed):
+        problems.append((column, value, f'ambiguous day/month, read as {parsed}'))
+    return parsed
 
 def map_status(status_str):
     """Map status from CSV to database status"""
@@ -109,15 +85,15 @@ def map_status(status_str):
     else:
         return 'pending'
 
-def generate_job_number(index, area):
-    """Generate unique job number"""
-    prefix_map = {
-        'Peterborough': 'PB', 'Leicester': 'LC', 'London': 'LD',
-        'Birmingham': 'BH', 'Luton': 'LT', 'Builders': 'BD',
-        'Unassigned': 'JB'
-    }
-    prefix = prefix_map.get(area, 'JB')
-    return f"{prefix}{str(index + 10000).zfill(6)}"
+JOB_NUMBER_PREFIXES = {
+    'Peterborough': 'PB', 'Leicester': 'LC', 'London': 'LD',
+    'Birmingham': 'BH', 'Luton': 'LT', 'Builders': 'BD',
+    'Unassigned': 'JB'
+}
+
+def job_number_prefix(area):
+    """Two-letter job number prefix for an area"""
+    return JOB_NUMBER_PREFIXES.get(area, 'JB')
 
 def find_csv_file(filename_patterns):
     """Find CSV file in current directory"""
@@ -126,263 +102,239 @@ def find_csv_file(filename_patterns):
             return pattern
     return None
 
-def parse_peterborough_leicester_csv():
-    """Parse Peterborough/Leicester/London CSV"""
-    jobs = []
-    csv_path = find_csv_file([
-        'Khlasa Scaffolding Jobs (Peterbrough__Job_).csv',
-        'Khlasa Scaffolding Jobs (Peterbrough Job).csv'
-    ])
+def parse_peterborough_leicester_row(row, formats, problems):
+    """Job from one row of the Peterborough/Leicester/London CSV, or None to skip it"""
+    if not row or len(row) < 6:
+        return None
     
-    if not csv_path:
-        print(f"   ⚠️ Peterborough CSV not found")
-        return jobs
+    # Skip header rows
+    if 'date' in str(row[0]).lower() or 'leicester' in ' '.join(str(cell).lower() for cell in row):
+        return None
     
-    print(f"   ✓ Found: {csv_path}")
+    # FIX: Corrected column indices to start from row[0] (Date)
+    date_str = str(row[0]).strip() if len(row) > 0 else ''
+    job_type = str(row[1]).strip() if len(row) > 1 else ''
+    address = str(row[2]).strip() if len(row) > 2 else ''
+    price = str(row[3]).strip() if len(row) > 3 else '0'
+    status = str(row[4]).strip() if len(row) > 4 else ''
+    fitter = str(row[5]).strip() if len(row) > 5 else ''
     
-    try:
-        with open(csv_path, 'r', encoding='utf-8-sig') as f:
-            reader = csv.reader(f)
-            rows = list(reader)
-            
-            for i, row in enumerate(rows):
-                if i < 2 or not row or len(row) < 6:
-                    continue
-                
-                # Skip header rows
-                if 'date' in str(row[0]).lower() or 'leicester' in ' '.join(str(cell).lower() for cell in row):
-                    continue
-                
-                try:
-                    # FIX: Corrected column indices to start from row[0] (Date)
-                    date_str = str(row[0]).strip() if len(row) > 0 else ''
-                    job_type = str(row[1]).strip() if len(row) > 1 else ''
-                    address = str(row[2]).strip() if len(row) > 2 else ''
-                    price = str(row[3]).strip() if len(row) > 3 else '0'
-                    status = str(row[4]).strip() if len(row) > 4 else ''
-                    fitter = str(row[5]).strip() if len(row) > 5 else ''
-                    
-                    if not date_str or not address:
-                        continue
-                    
-                    start_date = parse_date(date_str)
-                    if not start_date:
-                        continue
-                    
-                    # Extract postcode and determine area
-                    postcode = extract_postcode(address)
-                    area = get_area_from_postcode(postcode)
-                    
-                    try:
-                        price_val = float(price.replace(',', '')) if price and price != '0' else 0
-                    except:
-                        price_val = 0
-                    
-                    jobs.append({
-                        'date': start_date, 'jobType': job_type, 'address': address,
-                        'area': area, 'price': price_val, 'status': map_status(status),
-                        'fitter': fitter, 'truck': '', 'driver': '', 'time': None, 'finishDate': None,
-                        'postcode': postcode
-                    })
-                except:
-                    continue
-    except Exception as e:
-        print(f"   ⚠️ Error: {e}")
+    if not date_str or not address:
+        return None
+    
+    start_date = read_date(date_str, 'start', formats, problems)
+    if not start_date:
+        return None
     
-    return jobs
+    # Extract postcode and determine area
+    postcode, area = area_for_address(address)
+    
+    try:
+        price_val = float(price.replace(',', '')) if price and price != '0' else 0
+    except ValueError:
+        price_val = 0
+    
+    return {
+        'date': start_date, 'jobType': job_type, 'address': address,
+        'area': area, 'price': price_val, 'status': map_status(status),
+        'fitter': fitter, 'truck': '', 'driver': '', 'time': None, 'finishDate': None,
+        'postcode': postcode
+    }
 
-def parse_luton_csv():
-    """Parse Luton CSV"""
-    jobs = []
-    csv_path = find_csv_file([
-        'Khlasa Scaffolding Jobs (Luton_Job__(2)).csv',
-        'Khlasa Scaffolding Jobs (Luton Job (2)).csv'
-    ])
+def parse_luton_row(row, formats, problems):
+    """Job from one row of the Luton CSV, or None to skip it"""
+    if not row or len(row) < 6:
+        return None
     
-    if not csv_path:
-        print(f"   ⚠️ Luton CSV not found")
-        return jobs
+    date_str = str(row[0]).strip()
+    job_type = str(row[1]).strip() if len(row) > 1 else ''
+    address = str(row[2]).strip() if len(row) > 2 else ''
+    price = str(row[3]).strip() if len(row) > 3 else '0'
+    status = str(row[4]).strip() if len(row) > 4 else ''
+    fitter = str(row[5]).strip() if len(row) > 5 else ''
+    truck = str(row[6]).strip() if len(row) > 6 else ''
+    driver = str(row[7]).strip() if len(row) > 7 else ''
     
-    print(f"   ✓ Found: {csv_path}")
+    if not date_str or not address or date_str.lower() == 'date':
+        return None
     
-    try:
-        with open(csv_path, 'r', encoding='utf-8-sig') as f:
-            reader = csv.reader(f)
-            rows = list(reader)
-            
-            for i, row in enumerate(rows):
-                if i < 2 or not row or len(row) < 6:
-                    continue
-                
-                try:
-                    date_str = str(row[0]).strip()
-                    job_type = str(row[1]).strip() if len(row) > 1 else ''
-                    address = str(row[2]).strip() if len(row) > 2 else ''
-                    price = str(row[3]).strip() if len(row) > 3 else '0'
-                    status = str(row[4]).strip() if len(row) > 4 else ''
-                    fitter = str(row[5]).strip() if len(row) > 5 else ''
-                    truck = str(row[6]).strip() if len(row) > 6 else ''
-                    driver = str(row[7]).strip() if len(row) > 7 else ''
-                    
-                    if not date_str or not address or date_str.lower() == 'date':
-                        continue
-                    
-                    start_date = parse_date(date_str)
-                    if not start_date:
-                        continue
-                    
-                    # Extract postcode and determine area
-                    postcode = extract_postcode(address)
-                    area = get_area_from_postcode(postcode)
-                    
-                    try:
-                        price_val = float(price.replace(',', '')) if price and price != '0' else 0
-                    except:
-                        price_val = 0
-                    
-                    jobs.append({
-                        'date': start_date, 'jobType': job_type, 'address': address,
-                        'area': area, 'price': price_val, 'status': map_status(status),
-                        'fitter': fitter, 'truck': truck, 'driver': driver, 'time': None, 'finishDate': None,
-                        'postcode': postcode
-                    })
-                except:
-                    continue
-    except Exception as e:
-        print(f"   ⚠️ Error: {e}")
+    start_date = read_date(date_str, 'start', formats, problems)
+    if not start_date:
+        return None
     
-    return jobs
+    # Extract postcode and determine area
+    postcode, area = area_for_address(address)
+    
+    try:
+        price_val = float(price.replace(',', '')) if price and price != '0' else 0
+    except ValueError:
+        price_val = 0
+    
+    return {
+        'date': start_date, 'jobType': job_type, 'address': address,
+        'area': area, 'price': price_val, 'status': map_status(status),
+        'fitter': fitter, 'truck': truck, 'driver': driver, 'time': None, 'finishDate': None,
+        'postcode': postcode
+    }
 
-def parse_birmingham_csv():
-    """Parse Birmingham CSV"""
-    jobs = []
-    csv_path = find_csv_file([
-        'Khlasa Scaffolding Jobs (Khalsa_Scaffolding_BHM).csv',
-        'Khalsa_Scaffolding_BHM.csv'
-    ])
+def parse_birmingham_row(row, formats, problems):
+    """Job from one row of the Birmingham CSV, or None to skip it"""
+    if not row or len(row) < 6:
+        return None
     
-    if not csv_path:
-        print(f"   ⚠️ Birmingham CSV not found")
-        return jobs
+    date_str = str(row[0]).strip()
+    job_type = str(row[1]).strip() if len(row) > 1 else ''
+    address = str(row[2]).strip() if len(row) > 2 else ''
+    price = str(row[3]).strip() if len(row) > 3 else '0'
+    status = str(row[6]).strip() if len(row) > 6 else ''
+    fitter = str(row[7]).strip() if len(row) > 7 else ''
+    truck = str(row[8]).strip() if len(row) > 8 else ''
+    driver = str(row[9]).strip() if len(row) > 9 else ''
     
-    print(f"   ✓ Found: {csv_path}")
+    if not date_str or not address or date_str.lower() == 'date':
+        return None
     
-    try:
-        with open(csv_path, 'r', encoding='utf-8-sig') as f:
-            reader = csv.reader(f)
-            rows = list(reader)
-            
-            for i, row in enumerate(rows):
-                if i < 2 or not row or len(row) < 6:
-                    continue
-                
-                try:
-                    date_str = str(row[0]).strip()
-                    job_type = str(row[1]).strip() if len(row) > 1 else ''
-                    address = str(row[2]).strip() if len(row) > 2 else ''
-                    price = str(row[3]).strip() if len(row) > 3 else '0'
-                    status = str(row[6]).strip() if len(row) > 6 else ''
-                    fitter = str(row[7]).strip() if len(row) > 7 else ''
-                    truck = str(row[8]).strip() if len(row) > 8 else ''
-                    driver = str(row[9]).strip() if len(row) > 9 else ''
-                    
-                    if not date_str or not address or date_str.lower() == 'date':
-                        continue
-                    
-                    start_date = parse_date(date_str)
-                    if not start_date:
-                        continue
-                    
-                    # Extract postcode and determine area
-                    postcode = extract_postcode(address)
-                    area = get_area_from_postcode(postcode)
-                    
-                    try:
-                        price_val = float(price.replace(',', '')) if price and price != '0' else 0
-                    except:
-                        price_val = 0
-                    
-                    jobs.append({
-                        'date': start_date, 'jobType': job_type, 'address': address,
-                        'area': area, 'price': price_val, 'status': map_status(status),
-                        'fitter': fitter, 'truck': truck, 'driver': driver, 'time': None, 'finishDate': None,
-                        'postcode': postcode
-                    })
-                except:
-                    continue
-    except Exception as e:
-        print(f"   ⚠️ Error: {e}")
+    start_date = read_date(date_str, 'start', formats, problems)
+    if not start_date:
+        return None
     
-    return jobs
+    # Extract postcode and determine area
+    postcode, area = area_for_address(address)
+    
+    try:
+        price_val = float(price.replace(',', '')) if price and price != '0' else 0
+    except ValueError:
+        price_val = 0
+    
+    return {
+        'date': start_date, 'jobType': job_type, 'address': address,
+        'area': area, 'price': price_val, 'status': map_status(status),
+        'fitter': fitter, 'truck': truck, 'driver': driver, 'time': None, 'finishDate': None,
+        'postcode': postcode
+    }
 
-def parse_builder_jobs_csv():
-    """Parse Builder jobs CSV - Always stays in Builders area"""
-    jobs = []
-    csv_path = find_csv_file([
-        'Khlasa Scaffolding Jobs (Builders_Job__(3)).csv',
-        'Khlasa Scaffolding Jobs (Builders Job (3)).csv'
-    ])
+def parse_builder_jobs_row(row, formats, problems):
+    """Job from one row of the Builder jobs CSV - Always stays in Builders area"""
+    if len(row) < 6:
+        return None
     
-    if not csv_path:
-        print(f"   ⚠️ Builders CSV not found")
-        return jobs
+    date_str = str(row[0]).strip()
+    job_type = str(row[1]).strip() if len(row) > 1 else ''
+    builder = str(row[2]).strip() if len(row) > 2 else ''
+    phone = str(row[3]).strip() if len(row) > 3 else ''
+    address = str(row[4]).strip() if len(row) > 4 else ''
+    price = str(row[5]).strip() if len(row) > 5 else '0'
+    status = str(row[10]).strip() if len(row) > 10 else 'pending'
+    fitter = str(row[11]).strip() if len(row) > 11 else ''
+    time_weeks = str(row[12]).strip() if len(row) > 12 else ''
+    finish_date = str(row[13]).strip() if len(row) > 13 else ''
+    truck = str(row[14]).strip() if len(row) > 14 else ''
+    driver = str(row[15]).strip() if len(row) > 15 else ''
+    
+    if not date_str or not address:
+        return None
+    
+    start_date = read_date(date_str, 'start', formats, problems)
+    if not start_date:
+        return None
     
-    print(f"   ✓ Found: {csv_path}")
+    end_date = read_date(finish_date, 'finish', formats, problems)
     
+    try:
+        price_str = price.replace('+vat', '').replace('ok', '1000').strip()
+        price_val = float(price_str) if price_str and price_str.replace('.', '').isdigit() else 0
+    except ValueError:
+        price_val = 0
+    
+    # Builders jobs ALWAYS stay in Builders area
+    return {
+        'date': start_date, 'jobType': job_type, 'address': address,
+        'area': 'Builders', 'price': price_val, 'status': map_status(status),
+        'fitter': fitter, 'truck': truck, 'driver': driver,
+        'time': time_weeks if time_weeks and time_weeks != '0' else None,
+        'finishDate': end_date, 'builder': builder, 'phone': phone,
+        'postcode': extract_postcode(address)
+    }
+
+# Export layouts: row parser, date column positions, the file names each branch exports,
+# and the keywords that identify the layout when importing an arbitrary directory of exports
+CSV_LAYOUTS = {
+    'peterborough': {
+        'label': 'Peterborough',
+        'row_parser': parse_peterborough_leicester_row,
+        'date_columns': {'start': 0},
+        'files': ['Khlasa Scaffolding Jobs (Peterbrough__Job_).csv',
+                  'Khlasa Scaffolding Jobs (Peterbrough Job).csv'],
+        'keywords': ['peterb', 'leicester', 'london'],
+    },
+    'luton': {
+        'label': 'Luton',
+        'row_parser': parse_luton_row,
+        'date_columns': {'start': 0},
+        'files': ['Khlasa Scaffolding Jobs (Luton_Job__(2)).csv',
+                  'Khlasa Scaffolding Jobs (Luton Job (2)).csv'],
+        'keywords': ['luton'],
+    },
+    'birmingham': {
+        'label': 'Birmingham',
+        'row_parser': parse_birmingham_row,
+        'date_columns': {'start': 0},
+        'files': ['Khlasa Scaffolding Jobs (Khalsa_Scaffolding_BHM).csv',
+                  'Khalsa_Scaffolding_BHM.csv'],
+        'keywords': ['bhm', 'birmingham'],
+    },
+    'builders': {
+        'label': 'Builders',
+        'row_parser': parse_builder_jobs_row,
+        'date_columns': {'start': 0, 'finish': 13},
+        'files': ['Khlasa Scaffolding Jobs (Builders_Job__(3)).csv',
+                  'Khlasa Scaffolding Jobs (Builders Job (3)).csv'],
+        'keywords': ['builder'],
+    },
+}
+DEFAULT_LAYOUT = 'peterborough'  # plain Date, Type, Address, Price, Status, Fitter columns
+
+def detect_layout(filename):
+    """Export layout for a CSV file name"""
+    name = filename.lower()
+    for layout, spec in CSV_LAYOUTS.items():
+        if any(keyword in name for keyword in spec['keywords']):
+            return layout
+    return DEFAULT_LAYOUT
+
+def find_import_files(directory=None):
+    """(path, layout) pairs to import, in a fixed order
+
+    Without a directory, the known export names are looked up in the current
+    directory as before; with one, every .csv in it is imported (sorted by name)
+    with its layout detected from the file name.
+    """
+    if directory is None:
+        files = []
+        for layout, spec in CSV_LAYOUTS.items():
+            csv_path = find_csv_file(spec['files'])
+            if csv_path:
+                print(f"   ✓ Found: {csv_path}")
+                files.append((csv_path, layout))
+            else:
+                print(f"   ⚠️ {spec['label']} CSV not found")
+        return files
+    
+    names = sorted(name for name in os.listdir(directory) if name.lower().endswith('.csv'))
+    files = [(os.path.join(directory, name), detect_layout(name)) for name in names]
+    for path, layout in files:
+        print(f"   ✓ Found: {os.path.basename(path)} ({CSV_LAYOUTS[layout]['label']} layout)")
+    return files
+
+def iter_csv_rows(csv_path):
+    """Yield the data rows of an export, skipping its two title/header lines"""
     try:
         with open(csv_path, 'r', encoding='utf-8-sig') as f:
-            reader = csv.reader(f)
-            rows = list(reader)
-            
-            for i in range(2, len(rows)):
-                row = rows[i]
-                if len(row) < 6:
-                    continue
-                
-                try:
-                    date_str = str(row[0]).strip()
-                    job_type = str(row[1]).strip() if len(row) > 1 else ''
-                    builder = str(row[2]).strip() if len(row) > 2 else ''
-                    phone = str(row[3]).strip() if len(row) > 3 else ''
-                    address = str(row[4]).strip() if len(row) > 4 else ''
-                    price = str(row[5]).strip() if len(row) > 5 else '0'
-                    status = str(row[10]).strip() if len(row) > 10 else 'pending'
-                    fitter = str(row[11]).strip() if len(row) > 11 else ''
-                    time_weeks = str(row[12]).strip() if len(row) > 12 else ''
-                    finish_date = str(row[13]).strip() if len(row) > 13 else ''
-                    truck = str(row[14]).strip() if len(row) > 14 else ''
-                    driver = str(row[15]).strip() if len(row) > 15 else ''
-                    
-                    if not date_str or not address:
-                        continue
-                    
-                    start_date = parse_date(date_str)
-                    if not start_date:
-                        continue
-                    
-                    end_date = parse_date(finish_date) if finish_date else None
-                    
-                    try:
-                        price_str = price.replace('+vat', '').replace('ok', '1000').strip()
-                        price_val = float(price_str) if price_str and price_str.replace('.', '').isdigit() else 0
-                    except:
-                        price_val = 0
-                    
-                    # Builders jobs ALWAYS stay in Builders area
-                    jobs.append({
-                        'date': start_date, 'jobType': job_type, 'address': address,
-                        'area': 'Builders', 'price': price_val, 'status': map_status(status),
-                        'fitter': fitter, 'truck': truck, 'driver': driver,
-                        'time': time_weeks if time_weeks and time_weeks != '0' else None,
-                        'finishDate': end_date, 'builder': builder, 'phone': phone,
-                        'postcode': extract_postcode(address)
-                    })
-                except:
-                    continue
+            for i, row in enumerate(csv.reader(f)):
+                if i >= 2:
+                    yield row
     except Exception as e:
         print(f"   ⚠️ Error: {e}")
-    
-    return jobs
 
 def create_job_key(job):
     """Create unique key for deduplication"""
@@ -417,156 +369,386 @@ def merge_jobs(jobs):
                     merged['status'] = job['status']
             merged_jobs.append(merged)
     
-    print(f"   ℹ️ Merged {len(jobs)} jobs into {len(merged_jobs)} unique jobs")
     return merged_jobs
 
-def import_jobs():
-    """Main import function"""
-    if not os.path.exists(DB_PATH):
-        print(f"❌ Database not found at: {DB_PATH}")
-        return
-    
-    print("=" * 70)
-    print("  SMART JOB IMPORT - POSTCODE-BASED AREA ASSIGNMENT")
-    print("=" * 70)
-    print()
-    print(f"📂 Database: {DB_PATH}")
-    print(f"📂 Current directory: {os.getcwd()}")
-    print()
-    
-    # List CSV files
-    csv_files = [f for f in os.listdir(os.getcwd()) if f.endswith('.csv')]
-    print("📋 CSV files found:")
-    for f in csv_files:
-        print(f"   • {f}")
-    print()
-    
-    # Parse all jobs
-    print("📋 Parsing all CSV files...")
-    all_jobs = []
+# ============================================================================
+# STREAMING PIPELINE
+# ============================================================================
+
+IMPORT_CHUNK_SIZE = 500  # jobs held in memory at once while merging and writing
+PARSE_BATCH_ROWS = 2000  # CSV rows handed to a parser process at a time
+IMPORT_WORKERS = os.cpu_count() or 1
+
+def chunked(iterable, size=IMPORT_CHUNK_SIZE):
+    """Yield lists of up to size items from iterable"""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def sample_date_formats(rows, layout):
+    """Inferred (format, alternative) per date column of a layout, from sample rows"""
+    return {column: infer_date_format([row[index] for row in rows
+                                       if len(row) > index and row[index].strip().lower() != 'date'])
+            for column, index in CSV_LAYOUTS[layout]['date_columns'].items()}
+
+def iter_file_batches(path, layout):
+    """Yield (formats, first line number, rows) batches of one export
+
+    The date formats are inferred once from the top of the file and sent with every batch.
+    """
+    rows = iter_csv_rows(path)
+    sample = list(islice(rows, DATE_SAMPLE_ROWS))
+    formats = sample_date_formats(sample, layout)
+    line = 3  # after the title and header lines
+    for batch in chunked(chain(sample, rows), PARSE_BATCH_ROWS):
+        yield formats, line, batch
+        line += len(batch)
+
+def parse_rows(layout, formats, first_line, rows):
+    """Parse a batch of raw rows with a layout's row parser (runs in a worker process)
+
+    Returns (jobs, rejects) where rejects are (line, column, value, reason).
+    """
+    row_parser = CSV_LAYOUTS[layout]['row_parser']
+    jobs, rejects = [], []
+    for line, row in enumerate(rows, first_line):
+        problems = []
+        job = row_parser(row, formats, problems)
+        if job:
+            jobs.append(job)
+        rejects.extend((line,) + problem for problem in problems)
+    return jobs, rejects
+
+def iter_jobs(files, workers=IMPORT_WORKERS, rejects=None):
+    """Yield parsed jobs from (path, layout) files, in file and row order
+
+    Rows are read here and parsed in batches on a process pool. At most two
+    batches per worker are in flight, and results are taken back in
+    submission order, so the output is identical to a serial parse. Date
+    values that could not be read safely are appended to rejects, if given,
+    as (file name, line, column, value, reason).
+    """
+    batches = ((path, layout, batch) for path, layout in files
+               for batch in iter_file_batches(path, layout))
+    
+    def collect(path, parsed):
+        jobs, problems = parsed
+        if rejects is not None:
+            rejects.extend((os.path.basename(path),) + problem for problem in problems)
+        return jobs
     
-    all_jobs.extend(parse_peterborough_leicester_csv())
-    all_jobs.extend(parse_luton_csv())
-    all_jobs.extend(parse_birmingham_csv())
-    all_jobs.extend(parse_builder_jobs_csv())
+    if workers <= 1:
+        for path, layout, batch in batches:
+            yield from collect(path, parse_rows(layout, *batch))
+        return
     
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for path, layout, batch in batches:
+            pending.append((path, pool.submit(parse_rows, layout, *batch)))
+            if len(pending) >= workers * 2:
+                path, future = pending.popleft()
+                yield from collect(path, future.result())
+        while pending:
+            path, future = pending.popleft()
+            yield from collect(path, future.result())
+
+def write_rejects_report(rejects, path):
+    """Write date values that were rejected or read with an assumed order to a CSV file"""
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['File', 'Line', 'Column', 'Value', 'Problem'])
+        writer.writerows(rejects)
+
+def job_notes(job):
+    """Notes text summarising the extra CSV columns of a job"""
+    notes_parts = []
+    if job.get('fitter'):
+        notes_parts.append(f"Fitter: {job['fitter']}")
+    if job.get('driver'):
+        notes_parts.append(f"Driver: {job['driver']}")
+    if job.get('time'):
+        notes_parts.append(f"Duration: {job['time']} weeks")
+    if job.get('builder'):
+        notes_parts.append(f"Builder: {job['builder']}")
+    if job.get('phone'):
+        notes_parts.append(f"Phone: {job['phone']}")
+    if job.get('postcode'):
+        notes_parts.append(f"Postcode: {job['postcode']}")
+    return ' | '.join(notes_parts) if notes_parts else None
+
+# ============================================================================
+# BULK WRITER
+# ============================================================================
+
+# Merge rules, as SQL expressions over the stored row and "excluded" (the incoming row).
+# A key seen again later in the same import keeps its first non-empty values, like
+# merge_jobs(); a key already in the database takes the freshly imported values.
+STAGE_MERGE_RULES = {
+    'truck': "COALESCE(NULLIF(truck, ''), excluded.truck)",
+    'driver': "COALESCE(NULLIF(driver, ''), excluded.driver)",
+    'endDate': "COALESCE(endDate, excluded.endDate)",
+    'value': "MAX(value, excluded.value)",
+    'notes': "COALESCE(notes, excluded.notes)",
+    'status': "CASE WHEN status = 'pending' THEN excluded.status ELSE status END",
+}
+JOB_MERGE_RULES = {
+    'truck': "COALESCE(NULLIF(excluded.truck, ''), truck)",
+    'driver': "COALESCE(NULLIF(excluded.driver, ''), driver)",
+    'area': "excluded.area",
+    'endDate': "COALESCE(excluded.endDate, endDate)",
+    'value': "CASE WHEN excluded.value > COALESCE(value, 0) THEN excluded.value ELSE value END",
+    'notes': "COALESCE(excluded.notes, notes)",
+    'status': "CASE WHEN excluded.status != 'pending' THEN excluded.status ELSE status END",
+}
+
+def upsert_clause(rules, extra=''):
+    """ON CONFLICT(importKey) update applying rules, skipping rows the rules leave unchanged"""
+    assignments = ', '.join(f'{column} = {expr}' for column, expr in rules.items())
+    changed = ' OR '.join(f'({expr}) IS NOT {column}' for column, expr in rules.items())
+    return f'DO UPDATE SET {assignments}{extra} WHERE {changed}'
+
+def ensure_import_keys(conn):
+    """Add the persisted jobs.importKey dedup column, its UNIQUE index and reset trigger,
+    then key any jobs without one (jobs added in the app, or edited since the last import)
+
+    When several stored jobs share a key only the oldest gets it; the rest stay unkeyed.
+    """
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(jobs)')}
+    if 'importKey' not in columns:
+        conn.execute('ALTER TABLE jobs ADD COLUMN importKey TEXT')
+    conn.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_import_key ON jobs(importKey) '
+                 'WHERE importKey IS NOT NULL')
+    conn.execute('DROP TRIGGER IF EXISTS jobs_import_key_reset')  # replaces the unconditional version
+    conn.execute('''
+        CREATE TRIGGER jobs_import_key_reset
+        AFTER UPDATE OF startDate, location ON jobs
+        WHEN NEW.importKey IS NOT NULL
+             AND (OLD.startDate IS NOT NEW.startDate OR OLD.location IS NOT NEW.location)
+        BEGIN
+            UPDATE jobs SET importKey = NULL WHERE id = NEW.id;
+        END
+    ''')
+    unkeyed = conn.execute('SELECT id, startDate, location FROM jobs WHERE importKey IS NULL '
+                           'ORDER BY id').fetchall()
+    conn.executemany('UPDATE OR IGNORE jobs SET importKey = ? WHERE id = ?',
+                     ((create_job_key({'date': start, 'address': location or ''}), job_id)
+                      for job_id, start, location in unkeyed))
+
+def next_job_index(conn):
+    """First free index for importer job numbers (area prefix + six digits from 010000)"""
+    row = conn.execute('''
+        SELECT MAX(CAST(substr(jobNumber, 3) AS INTEGER)) FROM jobs
+        WHERE jobNumber GLOB '[A-Z][A-Z][0-9][0-9][0-9][0-9][0-9][0-9]'
+    ''').fetchone()
+    return 0 if row[0] is None else max(row[0] - 10000 + 1, 0)
+
+def stage_jobs(conn, jobs, progress=None, chunk_size=IMPORT_CHUNK_SIZE):
+    """Stage jobs into the temp import_stage table, merging duplicate keys; returns the count read
+
+    Touches only the temp database, so the app can keep writing while the CSVs are parsed.
+    """
+    conn.execute('''
+        CREATE TEMP TABLE import_stage (
+            seq INTEGER PRIMARY KEY,
+            importKey TEXT UNIQUE NOT NULL,
+            prefix TEXT, clientName TEXT, location TEXT, area TEXT, jobType TEXT,
+            truck TEXT, driver TEXT, startDate TEXT, endDate TEXT, status TEXT,
+            value REAL, notes TEXT, hasPostcode INTEGER
+        )
+    ''')
+    sql = f'''
+        INSERT INTO import_stage (importKey, prefix, clientName, location, area, jobType,
+                                  truck, driver, startDate, endDate, status, value, notes, hasPostcode)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(importKey) {upsert_clause(STAGE_MERGE_RULES)}
+    '''
+    done = 0
+    for chunk in chunked(jobs, chunk_size):
+        conn.execute('BEGIN')
+        conn.executemany(sql, ((create_job_key(job), job_number_prefix(job['area']),
+                                f"Client at {job['address'][:40]}...", job['address'], job['area'],
+                                job['jobType'], job.get('truck', ''), job.get('driver', ''), job['date'],
+                                job.get('finishDate'), job['status'], job['price'], job_notes(job),
+                                bool(job.get('postcode')))
+                               for job in merge_jobs(chunk)))
+        conn.execute('COMMIT')
+        done += len(chunk)
+        if progress:
+            progress(done)
+    return done
+
+def staged_summary(conn):
+    """Counts of the merged, staged jobs: total, with a detected postcode, and by area"""
+    total, with_postcode = conn.execute(
+        'SELECT COUNT(*), COALESCE(SUM(hasPostcode), 0) FROM import_stage').fetchone()
+    areas = dict(conn.execute('SELECT area, COUNT(*) FROM import_stage GROUP BY area'))
+    return {'total': total, 'with_postcode': with_postcode, 'areas': areas}
+
+def apply_staged_jobs(conn):
+    """Upsert import_stage into jobs in one statement; returns (inserted, updated, unchanged)"""
+    staged = conn.execute('SELECT COUNT(*) FROM import_stage').fetchone()[0]
+    inserted = conn.execute('''
+        SELECT COUNT(*) FROM import_stage s
+        WHERE NOT EXISTS (SELECT 1 FROM jobs WHERE importKey = s.importKey)
+    ''').fetchone()[0]
+    written = conn.execute(f'''
+        INSERT INTO jobs (jobNumber, importKey, clientName, location, area, jobType,
+                          truck, driver, startDate, endDate, status, value, notes)
+        SELECT prefix || printf('%06d', 10000 + ? + row_number() OVER (ORDER BY seq) - 1),
+               importKey, clientName, location, area, jobType,
+               truck, driver, startDate, endDate, status, value, notes
+        FROM import_stage WHERE true
+        ON CONFLICT(importKey) WHERE importKey IS NOT NULL
+        {upsert_clause(JOB_MERGE_RULES, ', updatedAt = CURRENT_TIMESTAMP')}
+    ''', (next_job_index(conn),)).rowcount
+    updated = written - inserted
+    return inserted, updated, staged - inserted - updated
+
+def write_jobs(jobs, progress=None, chunk_size=IMPORT_CHUNK_SIZE, confirm=None):
+    """Stage, merge and upsert jobs; returns (inserted, updated, unchanged)
+
+    jobs may be any iterable (normally the iter_jobs() generator); it is staged
+    chunk by chunk into a temp table, so memory use is bounded by chunk_size.
+    The jobs table is then changed in a single transaction: either every job is
+    written or, on error, none is. progress, if given, is called as
+    progress(done) after each staged chunk. confirm, if given, is called with the
+    staged_summary() once everything is staged; if it returns False nothing is
+    written and None is returned.
+    """
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)  # transactions managed here
+    try:
+        stage_jobs(conn, jobs, progress, chunk_size)
+        if confirm and not confirm(staged_summary(conn)):
+            return None
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            ensure_import_keys(conn)
+            counts = apply_staged_jobs(conn)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+    finally:
+        conn.close()
+    return counts
+
+def confirm_import(summary, rejects):
+    """Show the staged (merged) jobs and ask whether to write them"""
+    total = summary['total']
     print()
-    print(f"📊 Total jobs found: {len(all_jobs)}")
-    print()
-    
-    # Merge duplicates
-    print("🔄 Merging duplicates...")
-    all_jobs = merge_jobs(all_jobs)
+    print(f"📊 Total jobs found: {total}")
     print()
-    
-    # Show breakdown
-    area_counts = defaultdict(int)
-    for job in all_jobs:
-        area_counts[job['area']] += 1
+    if rejects:
+        write_rejects_report(rejects, REJECTS_REPORT_PATH)
+        print(f"⚠️ {len(rejects)} date value(s) rejected or ambiguous, see {REJECTS_REPORT_PATH}")
+        for file_name, line, column, value, reason in rejects[:10]:
+            print(f"   • {file_name} line {line}, {column} date {value!r}: {reason}")
+        if len(rejects) > 10:
+            print(f"   • ... and {len(rejects) - 10} more")
+        print()
+    if not total:
+        print("❌ Nothing to import")
+        return False
     
     print("📊 Jobs by area (after postcode detection):")
-    for area, count in sorted(area_counts.items()):
+    for area, count in sorted(summary['areas'].items()):
         print(f"   • {area}: {count} jobs")
     print()
     
     # Show postcode detection success rate
-    jobs_with_postcode = sum(1 for job in all_jobs if job.get('postcode'))
-    print(f"✓ Postcode detection: {jobs_with_postcode}/{len(all_jobs)} jobs ({jobs_with_postcode*100//len(all_jobs)}%)")
+    with_postcode = summary['with_postcode']
+    print(f"✓ Postcode detection: {with_postcode}/{total} jobs ({with_postcode*100//total}%)")
     print()
     
     # Confirm
     response = input("Import these jobs? (yes/no): ")
     if response.lower() != 'yes':
         print("❌ Import cancelled")
+        return False
+    print("\n🔥 Importing jobs...")
+    return True
+
+def import_jobs(directory=None, workers=IMPORT_WORKERS):
+    """Main import function
+
+    directory: import every .csv in this folder instead of the known export
+    names in the current directory. workers: parser processes to use.
+    """
+    if not os.path.exists(DB_PATH):
+        print(f"❌ Database not found at: {DB_PATH}")
         return
     
-    # Import
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+    print("=" * 70)
+    print("  SMART JOB IMPORT - POSTCODE-BASED AREA ASSIGNMENT")
+    print("=" * 70)
+    print()
+    print(f"📂 Database: {DB_PATH}")
+    print(f"📂 Import directory: {os.path.abspath(directory or os.getcwd())}")
+    print(f"⚙️ Parser processes: {workers}")
+    print()
     
-    cursor.execute("SELECT jobNumber, location, startDate FROM jobs")
-    existing = cursor.fetchall()
-    existing_keys = {f"{row[2]}_{row[1].lower().strip()}": row[0] for row in existing}
+    # Find CSV files
+    print("📋 CSV files found:")
+    files = find_import_files(directory)
+    print()
     
-    imported, updated, skipped = 0, 0, 0
+    print("🗓️ Date formats (inferred from the first rows of each file):")
+    for path, layout in files:
+        sample = list(islice(iter_csv_rows(path), DATE_SAMPLE_ROWS))
+        for column, (date_format, alternative) in sample_date_formats(sample, layout).items():
+            assumed = ' (assumed - no day above 12 in the sample)' if alternative else ''
+            print(f"   • {os.path.basename(path)}, {column} date: {date_format or 'unrecognised'}{assumed}")
+    print()
     
-    print("\n🔥 Importing jobs...")
+    # Single pass: parse into the staging table, then preview before anything is written
+    print("📋 Parsing and staging all CSV files...")
+    rejects = []
+    staged = {}
     
-    for i, job in enumerate(all_jobs):
-        job_key = create_job_key(job)
-        client_name = f"Client at {job['address'][:40]}..."
-        
-        # Create notes
-        notes_parts = []
-        if job.get('fitter'):
-            notes_parts.append(f"Fitter: {job['fitter']}")
-        if job.get('driver'):
-            notes_parts.append(f"Driver: {job['driver']}")
-        if job.get('time'):
-            notes_parts.append(f"Duration: {job['time']} weeks")
-        if job.get('builder'):
-            notes_parts.append(f"Builder: {job['builder']}")
-        if job.get('phone'):
-            notes_parts.append(f"Phone: {job['phone']}")
-        if job.get('postcode'):
-            notes_parts.append(f"Postcode: {job['postcode']}")
-        notes = ' | '.join(notes_parts) if notes_parts else None
-        
-        try:
-            if job_key in existing_keys:
-                job_number = existing_keys[job_key]
-                cursor.execute('''
-                    UPDATE jobs 
-                    SET truck = COALESCE(NULLIF(?, ''), truck),
-                        driver = COALESCE(NULLIF(?, ''), driver),
-                        area = ?,
-                        endDate = COALESCE(?, endDate),
-                        value = CASE WHEN ? > COALESCE(value, 0) THEN ? ELSE value END,
-                        notes = COALESCE(?, notes),
-                        status = CASE WHEN ? != 'pending' THEN ? ELSE status END,
-                        updatedAt = CURRENT_TIMESTAMP
-                    WHERE jobNumber = ?
-                ''', (job.get('truck', ''), job.get('driver', ''), job['area'], job.get('finishDate'),
-                      job['price'], job['price'], notes, job['status'], job['status'], job_number))
-                updated += 1
-            else:
-                job_number = generate_job_number(i, job['area'])
-                cursor.execute('''
-                    INSERT INTO jobs (
-                        jobNumber, clientName, location, area, jobType,
-                        truck, driver, startDate, endDate, status, value, notes,
-                        createdAt, updatedAt
-                    )
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-                ''', (job_number, client_name, job['address'], job['area'], job['jobType'],
-                      job.get('truck', ''), job.get('driver', ''), job['date'],
-                      job.get('finishDate'), job['status'], job['price'], notes))
-                imported += 1
-            
-            if (imported + updated) % 100 == 0:
-                conn.commit()
-                print(f"   ✓ Processed {imported + updated} jobs...")
-        except Exception as e:
-            skipped += 1
-            continue
-    
-    conn.commit()
-    conn.close()
+    def confirm(summary):
+        staged.update(summary)
+        return confirm_import(summary, rejects)
+    
+    try:
+        counts = write_jobs(iter_jobs(files, workers, rejects),
+                            progress=lambda done: print(f"   ✓ Staged {done} jobs..."), confirm=confirm)
+    except sqlite3.Error as e:
+        print(f"❌ Import failed, no jobs were changed: {e}")
+        return
+    if counts is None:
+        return
+    inserted, updated, unchanged = counts
     
     print()
     print("=" * 70)
     print(f"✅ Import complete!")
-    print(f"   • New jobs: {imported}")
+    print(f"   • New jobs: {inserted}")
     print(f"   • Updated: {updated}")
-    if skipped > 0:
-        print(f"   • Skipped: {skipped}")
+    print(f"   • Unchanged: {unchanged}")
     print()
     print("📊 Final breakdown by area:")
-    for area, count in sorted(area_counts.items()):
+    for area, count in sorted(staged['areas'].items()):
         print(f"   • {area}: {count} jobs")
     print("=" * 70)
     print()
 
+def parse_args():
+    """Command line options"""
+    import argparse
+    parser = argparse.ArgumentParser(description='Import scaffolding jobs from branch CSV exports')
+    parser.add_argument('--dir', dest='directory',
+                        help='import every .csv in this folder (layout detected from the file name)')
+    parser.add_argument('--workers', type=int, default=IMPORT_WORKERS,
+                        help=f'parser processes (default {IMPORT_WORKERS}, the number of CPU cores)')
+    return parser.parse_args()
+
 if __name__ == '__main__':
-    import_jobs()
-    input("Press Enter to exit...")
\ No newline at end of file
+    args = parse_args()
+    import_jobs(args.directory, args.workers)
+    input("Press Enter to exit...")
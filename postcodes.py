@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Postcode Resolver - UK postcode extraction and branch area lookup
+Shared by the job importer and the API; areas come from data/postcode_areas.csv
+"""
+
+import os
+import csv
+import re
+
+POSTCODE_TABLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'postcode_areas.csv')
+UNASSIGNED = 'Unassigned'
+
+POSTCODE_PATTERN = re.compile(r'\b([A-Z]{1,2}\d{1,2}[A-Z]?\s?\d[A-Z]{2})\b')
+POSTCODE_AREA_PATTERN = re.compile(r'[A-Z]+')
+
+def load_postcode_table(path=POSTCODE_TABLE):
+    """Branch area keyed on postcode area (the leading letters, e.g. "PE")"""
+    with open(path, newline='', encoding='utf-8') as f:
+        return {row['prefix'].strip().upper(): row['area'].strip()
+                for row in csv.DictReader(f) if row['prefix'].strip()}
+
+POSTCODE_AREAS = load_postcode_table()
+
+def extract_postcode(address):
+    """First UK postcode in an address, upper case without the space, or None"""
+    match = POSTCODE_PATTERN.search(address.upper()) if address else None
+    return match.group(1).replace(' ', '') if match else None
+
+def area_for_postcode(postcode):
+    """Branch area for a postcode's postcode area, else Unassigned"""
+    if not postcode:
+        return UNASSIGNED
+    match = POSTCODE_AREA_PATTERN.match(postcode.upper())
+    return POSTCODE_AREAS.get(match.group(), UNASSIGNED) if match else UNASSIGNED
+
+def area_for_address(address):
+    """(postcode, branch area) for a free-text address"""
+    postcode = extract_postcode(address)
+    return postcode, area_for_postcode(postcode)
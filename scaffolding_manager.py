@@ -6,31 +6,102 @@ Complete business management system with comprehensive financial management
 
 import sys
 import os
+import csv
 import json
 import sqlite3
 import webbrowser
 import threading
 import base64
-from datetime import datetime
-from flask import Flask, request, jsonify, send_from_directory
+import queue
+import atexit
+import hashlib
+import secrets
+import gzip
+import zlib
+import zipfile
+import re
+import tempfile
+import time
+import multiprocessing
+from functools import wraps
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from flask import Flask, Response, request, jsonify, send_file, send_from_directory, render_template, g
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from werkzeug.exceptions import NotFound
 from werkzeug.utils import secure_filename
 from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
 from openpyxl.utils import get_column_letter
 from io import BytesIO
+import postcodes
+
+try:
+    import orjson  # Optional: much faster JSON encoding when installed
+except ImportError:
+    orjson = None
+
+try:
+    from PIL import Image, ImageOps, features  # Optional: receipt thumbnails
+except ImportError:
+    Image = None
+
+try:
+    import pypdfium2 as pdfium  # Optional: first-page thumbnails for PDF receipts
+except ImportError:
+    pdfium = None
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider using orjson when available, falling back to the stdlib encoder"""
+    sort_keys = False
+    ensure_ascii = False
+    
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return self._encode(obj).decode('utf-8')
+        return super().dumps(obj, **kwargs)
+    
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+    
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self._encode(obj), mimetype=self.mimetype)
+    
+    def _encode(self, obj):
+        """Serialize obj to compact UTF-8 JSON bytes"""
+        if orjson is not None:
+            return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(obj, default=self.default, ensure_ascii=False,
+                          separators=(',', ':')).encode('utf-8')
 
 # Initialize Flask app
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
 
+# Response compression
+COMPRESS_MIN_SIZE = 1024  # bytes; smaller bodies aren't worth compressing
+COMPRESS_LEVEL = 1  # fastest level; most of the gain on repetitive JSON comes at level 1
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/x-ndjson', 'text/html', 'text/csv',
+                          'text/css', 'text/plain', 'application/javascript'}
+
 # File upload configuration
 UPLOAD_FOLDER = os.path.join(os.path.expanduser('~'), 'scaffolding_receipts')
 ALLOWED_EXTENSIONS = {'pdf', 'png', 'jpg', 'jpeg', 'gif', 'webp'}
 MAX_FILE_SIZE = 10 * 1024 * 1024  # 10MB
 
+THUMBNAIL_FOLDER = os.path.join(UPLOAD_FOLDER, 'thumbnails')
+
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
+if not os.path.exists(THUMBNAIL_FOLDER):
+    os.makedirs(THUMBNAIL_FOLDER)
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
@@ -38,12 +109,145 @@ app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE
 # Database setup
 DB_PATH = os.path.join(os.path.expanduser('~'), 'scaffolding_business.db')
 
+# Connection pool configuration
+DB_POOL_SIZE = 8
+DB_BUSY_TIMEOUT_MS = 5000
+
+_db_pool = queue.LifoQueue(maxsize=DB_POOL_SIZE)
+_db_pool_lock = threading.Lock()
+_db_connections = []
+
+def _open_connection():
+    """Open a new SQLite connection with WAL journaling and tuned pragmas"""
+    conn = sqlite3.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute(f'PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}')
+    conn.execute('PRAGMA cache_size=-16000')  # 16MB page cache per connection
+    conn.execute('PRAGMA temp_store=MEMORY')
+    conn.execute('PRAGMA mmap_size=67108864')  # 64MB memory-mapped I/O
+    with _db_pool_lock:
+        _db_connections.append(conn)
+    return conn
+
+def _acquire_connection():
+    """Take a warm connection from the pool, opening a new one if the pool is empty"""
+    try:
+        return _db_pool.get_nowait()
+    except queue.Empty:
+        return _open_connection()
+
+def _release_connection(conn):
+    """Return a connection to the pool, closing it if the pool is already full"""
+    if conn.in_transaction:
+        conn.rollback()
+    try:
+        _db_pool.put_nowait(conn)
+    except queue.Full:
+        with _db_pool_lock:
+            if conn in _db_connections:
+                _db_connections.remove(conn)
+        conn.close()
+
+def get_db():
+    """Get the pooled connection bound to the current request"""
+    if 'db' not in g:
+        g.db = _acquire_connection()
+    return g.db
+
+@app.teardown_appcontext
+def release_db(exception):
+    """Hand the request's connection back to the pool"""
+    conn = g.pop('db', None)
+    if conn is not None:
+        _release_connection(conn)
+
+@contextmanager
+def db_connection():
+    """Borrow a pooled connection outside of a request (startup, background work)"""
+    conn = _acquire_connection()
+    try:
+        yield conn
+    finally:
+        _release_connection(conn)
+
+def close_all_connections():
+    """Close every connection opened by the pool (called on shutdown)"""
+    with _db_pool_lock:
+        connections = list(_db_connections)
+        _db_connections.clear()
+    while True:
+        try:
+            _db_pool.get_nowait()
+        except queue.Empty:
+            break
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.ProgrammingError:
+            pass
+
+atexit.register(close_all_connections)
+
+def _negotiate_encoding(accept_encoding):
+    """Pick gzip or deflate from an Accept-Encoding header, or None"""
+    for encoding in ('gzip', 'deflate'):
+        if accept_encoding[encoding] > 0:
+            return encoding
+    return None
+
+@app.after_request
+def compress_response(response):
+    """Compress large text responses with gzip or deflate as negotiated by the client"""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = _negotiate_encoding(request.accept_encodings)
+    body = response.get_data()
+    if encoding is None or len(body) < COMPRESS_MIN_SIZE:
+        return response
+    
+    if encoding == 'gzip':
+        body = gzip.compress(body, compresslevel=COMPRESS_LEVEL)
+    else:
+        body = zlib.compress(body, COMPRESS_LEVEL)
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        # The compressed bytes differ from the identity body, so the tag can only be weak
+        response.set_etag(etag, weak=True)
+    return response
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 def init_database():
     """Initialize SQLite database with all required tables"""
-    conn = sqlite3.connect(DB_PATH)
+    with db_connection() as conn:
+        _create_tables(conn)
+        normalize_stored_dates(conn)
+        _create_indexes(conn)
+        _create_change_feed(conn)
+        _create_table_versions(conn)
+        _create_monthly_rollup(conn)
+        _create_receipt_store(conn)
+        _create_tasks_table(conn)
+        scans = check_index_coverage(conn)
+    print(f"✅ Database initialized at: {DB_PATH}")
+    print(f"📁 Receipt folder: {UPLOAD_FOLDER}")
+    if scans:
+        print(f"⚠️ {len(scans)} query shape(s) still fall back to a table scan:")
+        for name, detail in scans:
+            print(f"   • {name}: {detail}")
+    else:
+        print(f"✅ Index coverage verified for {len(INDEX_CHECK_QUERIES)} query shapes")
+
+def _create_tables(conn):
+    """Create all tables if they don't already exist"""
     cursor = conn.cursor()
     
     # Invoices table
@@ -147,56 +351,898 @@ def init_database():
     ''')
     
     conn.commit()
-    conn.close()
-    print(f"✅ Database initialized at: {DB_PATH}")
-    print(f"📁 Receipt folder: {UPLOAD_FOLDER}")
+
+# Indexes for the query shapes the API runs: (name, table, columns)
+PLANNED_INDEXES = [
+    ('idx_transactions_type_date', 'transactions', 'transactionType, date'),
+    ('idx_transactions_date', 'transactions', 'date'),
+    ('idx_transactions_linked_job', 'transactions', 'linkedJobId'),
+    ('idx_jobs_created', 'jobs', 'createdAt'),
+    ('idx_jobs_status_start', 'jobs', 'status, startDate'),
+    ('idx_jobs_area_created', 'jobs', 'area, createdAt'),
+    ('idx_jobs_start', 'jobs', 'startDate'),
+    ('idx_invoices_date', 'invoices', 'date'),
+    ('idx_invoices_linked_job', 'invoices', 'linkedJobId'),
+    ('idx_inquiries_date', 'inquiries', 'date'),
+    ('idx_inquiries_linked_job', 'inquiries', 'linkedJobId'),
+]
+
+# Representative queries checked with EXPLAIN QUERY PLAN at startup: (name, sql, params)
+INDEX_CHECK_QUERIES = [
+    ('jobs by createdAt', 'SELECT * FROM jobs ORDER BY createdAt DESC, id DESC', ()),
+    ('jobs page', 'SELECT * FROM jobs WHERE (createdAt, id) < (?, ?) ORDER BY createdAt DESC, id DESC LIMIT 100',
+     ('2024-01-01 00:00:00', 1)),
+    ('jobs by area', 'SELECT * FROM jobs WHERE area = ? ORDER BY createdAt DESC', ('London',)),
+    ('completed jobs in range',
+     "SELECT * FROM jobs WHERE status = 'completed' AND startDate >= ? AND startDate < ?",
+     ('2024-01-01', '2025-01-01')),
+    ('transactions by date', 'SELECT * FROM transactions ORDER BY date DESC, id DESC', ()),
+    ('transactions page',
+     'SELECT * FROM transactions WHERE (date, id) < (?, ?) ORDER BY date DESC, id DESC LIMIT 100',
+     ('2024-01-01', 1)),
+    ('transactions by type in range',
+     'SELECT * FROM transactions WHERE transactionType = ? AND date >= ? AND date < ?',
+     ('out', '2024-01-01', '2025-01-01')),
+    ('transactions in range', 'SELECT * FROM transactions WHERE date >= ? AND date < ?',
+     ('2024-01-01', '2025-01-01')),
+    ('transactions for job', 'SELECT * FROM transactions WHERE linkedJobId = ?', (1,)),
+    ('invoices by date', 'SELECT * FROM invoices ORDER BY date DESC, id DESC', ()),
+    ('invoices page', 'SELECT * FROM invoices WHERE (date, id) < (?, ?) ORDER BY date DESC, id DESC LIMIT 100',
+     ('2024-01-01', 1)),
+    ('invoices for job', 'SELECT * FROM invoices WHERE linkedJobId = ?', (1,)),
+    ('inquiries by date', 'SELECT * FROM inquiries ORDER BY date DESC, id DESC', ()),
+    ('inquiries page', 'SELECT * FROM inquiries WHERE (date, id) < (?, ?) ORDER BY date DESC, id DESC LIMIT 100',
+     ('2024-01-01', 1)),
+    ('inquiries for job', 'SELECT * FROM inquiries WHERE linkedJobId = ?', (1,)),
+    ('vehicles by registration', 'SELECT * FROM vehicles ORDER BY registration', ()),
+    ('monthly rollup for year',
+     'SELECT month, SUM(revenue), SUM(expenses) FROM monthly_financials WHERE month >= ? AND month < ? GROUP BY month',
+     ('2024-01', '2025-01')),
+]
+
+def _create_indexes(conn):
+    """Create the planned index set and refresh the planner statistics"""
+    for name, table, columns in PLANNED_INDEXES:
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table}({columns})')
+    conn.execute('PRAGMA optimize')
+    conn.commit()
+
+def check_index_coverage(conn):
+    """Return (name, plan detail) for every checked query that still scans a table"""
+    scans = []
+    for name, sql, params in INDEX_CHECK_QUERIES:
+        for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}', params):
+            detail = row['detail']
+            full_scan = detail.startswith('SCAN') and 'USING' not in detail
+            if full_scan or 'TEMP B-TREE' in detail:
+                scans.append((name, detail))
+    return scans
+
+# ============================================================================
+# KEYSET PAGINATION
+# ============================================================================
+
+PAGE_SIZE_DEFAULT = 100
+PAGE_SIZE_MAX = 1000
+
+def encode_cursor(sort_value, row_id):
+    """Encode the sort key of the last row on a page as an opaque cursor"""
+    payload = json.dumps([sort_value, row_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii')
+
+def decode_cursor(token):
+    """Decode a cursor produced by encode_cursor, raising ValueError if malformed"""
+    try:
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(row_id, int):
+        raise ValueError('Invalid cursor')
+    return sort_value, row_id
+
+def list_rows(conn, table, sort_column, where='', params=()):
+    """List rows newest first, keyset-paginated on (sort_column, id) when requested
+
+    Without `limit` or `after` the full array is returned as before. With
+    either, the response is {'items', 'next_cursor', 'limit'} and the next page
+    is fetched by passing next_cursor back as `after`.
+    """
+    limit_arg = request.args.get('limit')
+    after = request.args.get('after')
+    order_by = f' ORDER BY {sort_column} DESC, id DESC'
+    query = f'SELECT * FROM {table} WHERE 1=1{where}'
+    params = list(params)
+    
+    if limit_arg is None and after is None:
+        rows = conn.execute(query + order_by, params).fetchall()
+        return jsonify([dict(row) for row in rows])
+    
+    try:
+        limit = min(max(int(limit_arg or PAGE_SIZE_DEFAULT), 1), PAGE_SIZE_MAX)
+        if after:
+            sort_value, row_id = decode_cursor(after)
+            query += f' AND ({sort_column}, id) < (?, ?)'
+            params.extend([sort_value, row_id])
+    except ValueError as e:
+        return jsonify({'error': f'Invalid pagination parameters: {str(e)}'}), 400
+    
+    rows = conn.execute(query + order_by + ' LIMIT ?', params + [limit + 1]).fetchall()
+    items = [dict(row) for row in rows[:limit]]
+    next_cursor = None
+    if len(rows) > limit:
+        last = items[-1]
+        next_cursor = encode_cursor(last[sort_column], last['id'])
+    
+    return jsonify({'items': items, 'next_cursor': next_cursor, 'limit': limit})
+
+# ============================================================================
+# DATE RANGES
+# ============================================================================
+
+# Stored date columns, kept in ISO YYYY-MM-DD so range predicates compare correctly
+DATE_COLUMNS = {
+    'transactions': ['date'],
+    'jobs': ['startDate', 'endDate'],
+    'invoices': ['date'],
+    'inquiries': ['date'],
+    'vehicles': ['motDue', 'taxDue', 'tachoDue', 'insuranceDue', 'maintenanceDue'],
+}
+
+# Accepted input formats, tried in order (UK day-first before anything else)
+DATE_INPUT_FORMATS = ['%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y', '%Y/%m/%d']
+
+def normalize_date(value):
+    """Return value as an ISO YYYY-MM-DD string, or unchanged if it isn't a recognisable date"""
+    if not value or not isinstance(value, str):
+        return value
+    text = value.strip()
+    if len(text) > 10 and text[4:5] == '-' and text[10:11] in ('T', ' '):
+        text = text[:10]  # ISO datetime, keep the date part
+    for fmt in DATE_INPUT_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    return value
+
+def normalize_stored_dates(conn):
+    """Rewrite any non-ISO values in the stored date columns to YYYY-MM-DD"""
+    iso_glob = '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]'
+    fixed = 0
+    for table, columns in DATE_COLUMNS.items():
+        existing = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+        for column in columns:
+            if column not in existing:
+                continue
+            rows = conn.execute(f'''
+                SELECT id, {column} FROM {table}
+                WHERE {column} IS NOT NULL AND {column} != '' AND {column} NOT GLOB ?
+            ''', (iso_glob,)).fetchall()
+            updates = [(normalize_date(row[1]), row[0]) for row in rows
+                       if normalize_date(row[1]) != row[1]]
+            conn.executemany(f'UPDATE {table} SET {column} = ? WHERE id = ?', updates)
+            fixed += len(updates)
+    conn.commit()
+    if fixed:
+        print(f"🗓️ Normalised {fixed} stored date value(s) to YYYY-MM-DD")
+
+def _parse_iso_date(value, name):
+    try:
+        return datetime.strptime(normalize_date(value), '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ValueError(f'{name} must be a date (YYYY-MM-DD)')
+
+def _month_start(year, month):
+    """First day of the given month, rolling over into the next year as needed"""
+    return datetime(year + (month - 1) // 12, (month - 1) % 12 + 1, 1).date()
+
+def date_range_from_args(args):
+    """Turn request arguments into a half-open (start, end) ISO date range
+
+    Supports year, year+quarter (1-4), month (YYYY-MM) and start_date/end_date
+    (end inclusive, either may be omitted). Either bound of the result may be
+    None. Returns None if no date arguments were given; raises ValueError on
+    malformed input.
+    """
+    year = args.get('year')
+    quarter = args.get('quarter')
+    month = args.get('month')
+    start_date = args.get('start_date')
+    end_date = args.get('end_date')
+    
+    if month:
+        try:
+            month_date = datetime.strptime(month, '%Y-%m')
+        except ValueError:
+            raise ValueError('month must be YYYY-MM')
+        start = _month_start(month_date.year, month_date.month)
+        end = _month_start(month_date.year, month_date.month + 1)
+    elif year:
+        try:
+            year = int(year)
+        except ValueError:
+            raise ValueError('year must be a number')
+        if quarter:
+            if quarter not in ('1', '2', '3', '4'):
+                raise ValueError('quarter must be 1-4')
+            first_month = (int(quarter) - 1) * 3 + 1
+            start = _month_start(year, first_month)
+            end = _month_start(year, first_month + 3)
+        else:
+            start = _month_start(year, 1)
+            end = _month_start(year + 1, 1)
+    elif start_date or end_date:
+        start = _parse_iso_date(start_date, 'start_date') if start_date else None
+        end = _parse_iso_date(end_date, 'end_date') + timedelta(days=1) if end_date else None
+    else:
+        return None
+    
+    return (start.isoformat() if start else None, end.isoformat() if end else None)
+
+def date_range_filter(column, date_range):
+    """SQL fragment and params restricting column to a half-open date range"""
+    sql = ''
+    params = []
+    if date_range and date_range[0]:
+        sql += f' AND {column} >= ?'
+        params.append(date_range[0])
+    if date_range and date_range[1]:
+        sql += f' AND {column} < ?'
+        params.append(date_range[1])
+    return sql, params
+
+def is_month_aligned(date_range):
+    """True if both bounds of the range fall on the first day of a month"""
+    return all(bound is None or bound.endswith('-01') for bound in date_range)
+
+# ============================================================================
+# CHANGE FEED
+# ============================================================================
+
+CHANGE_FEED_TABLES = ['invoices', 'inquiries', 'vehicles', 'jobs', 'transactions']
+CHANGE_LOG_RETENTION = 50000  # change_log rows kept after pruning at startup
+
+def _create_change_feed(conn):
+    """Create the change_log table and the triggers that maintain it"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS change_log (
+            version INTEGER PRIMARY KEY AUTOINCREMENT,
+            tableName TEXT NOT NULL,
+            rowId INTEGER NOT NULL,
+            operation TEXT NOT NULL,
+            changedAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    for table in CHANGE_FEED_TABLES:
+        for event, ref in (('INSERT', 'NEW'), ('UPDATE', 'NEW'), ('DELETE', 'OLD')):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_log
+                AFTER {event} ON {table}
+                BEGIN
+                    INSERT INTO change_log (tableName, rowId, operation)
+                    VALUES ('{table}', {ref}.id, '{event.lower()}');
+                END
+            ''')
+    
+    # Keep the log bounded; clients older than the retained window get a reset
+    conn.execute('''
+        DELETE FROM change_log
+        WHERE version <= (SELECT COALESCE(MAX(version), 0) FROM change_log) - ?
+    ''', (CHANGE_LOG_RETENTION,))
+    conn.commit()
+
+def current_change_version(conn):
+    """Latest change_log version (0 if nothing has changed yet)"""
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'change_log'").fetchone()
+    return row[0] if row else 0
+
+def _fetch_rows_by_id(conn, table, ids):
+    """Fetch rows of table whose id is in ids, in chunks below SQLite's variable limit"""
+    rows = []
+    for start in range(0, len(ids), 500):
+        chunk = ids[start:start + 500]
+        placeholders = ','.join('?' * len(chunk))
+        rows.extend(conn.execute(f'SELECT * FROM {table} WHERE id IN ({placeholders})', chunk))
+    return [dict(row) for row in rows]
+
+@app.route('/api/changes', methods=['GET'])
+def get_changes():
+    """Rows inserted, updated or deleted since a change_log version
+
+    Without `since` only the current version is returned, so a client can
+    record it before doing a full load. Each changed row is reported once with
+    its current contents, or as a deleted id if it no longer exists. `reset`
+    is true when `since` predates the retained log and a full reload is needed.
+    """
+    conn = get_db()
+    version = current_change_version(conn)
+    since = request.args.get('since')
+    if since is None:
+        return jsonify({'version': version})
+    
+    try:
+        since = int(since)
+    except ValueError:
+        return jsonify({'error': 'since must be an integer version'}), 400
+    
+    oldest = conn.execute('SELECT MIN(version) FROM change_log').fetchone()[0]
+    stale = since < version and (oldest is None or since < oldest - 1)
+    if stale or since > version:
+        return jsonify({'version': version, 'reset': True, 'changes': {}})
+    
+    changed = {}
+    for row in conn.execute('''
+        SELECT DISTINCT tableName, rowId FROM change_log
+        WHERE version > ? AND version <= ?
+    ''', (since, version)):
+        changed.setdefault(row['tableName'], []).append(row['rowId'])
+    
+    changes = {}
+    for table, ids in changed.items():
+        if table not in CHANGE_FEED_TABLES:
+            continue
+        upserted = _fetch_rows_by_id(conn, table, ids)
+        present = {row['id'] for row in upserted}
+        changes[table] = {
+            'upserted': upserted,
+            'deleted': [row_id for row_id in ids if row_id not in present]
+        }
+    
+    return jsonify({'version': version, 'reset': False, 'changes': changes})
+
+# ============================================================================
+# CONDITIONAL GET (ETags)
+# ============================================================================
+
+EPOCH_KEY = '_epoch'  # table_versions row holding a random per-database token
+
+def _create_table_versions(conn):
+    """Create table_versions and the triggers that bump a table's version on every write"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS table_versions (
+            tableName TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    # The epoch keeps ETags from colliding if the database is ever recreated
+    conn.execute('INSERT OR IGNORE INTO table_versions (tableName, version) VALUES (?, ?)',
+                 (EPOCH_KEY, secrets.randbelow(2 ** 31)))
+    for table in CHANGE_FEED_TABLES:
+        conn.execute('INSERT OR IGNORE INTO table_versions (tableName) VALUES (?)', (table,))
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_version
+                AFTER {event} ON {table}
+                BEGIN
+                    UPDATE table_versions SET version = version + 1 WHERE tableName = '{table}';
+                END
+            ''')
+    conn.commit()
+
+def data_etag(conn, tables):
+    """ETag for the current request over the given tables' data versions"""
+    placeholders = ','.join('?' * (len(tables) + 1))
+    versions = dict(conn.execute(
+        f'SELECT tableName, version FROM table_versions WHERE tableName IN ({placeholders})',
+        [EPOCH_KEY] + list(tables)).fetchall())
+    state = [versions.get(EPOCH_KEY)] + [versions.get(table) for table in tables]
+    # Filters and pagination change the body, so the query string is part of the tag
+    query = hashlib.sha1(request.query_string).hexdigest()[:12]
+    return '-'.join(str(part) for part in state) + '-' + query
+
+def conditional_on(*tables):
+    """Serve a GET with an ETag from the tables' data versions, answering 304 when unchanged"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = data_etag(get_db(), tables)
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                response = app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        return wrapper
+    return decorator
+
+# ============================================================================
+# MONTHLY FINANCIAL ROLLUP
+# ============================================================================
+
+JOBS_ROLLUP_CATEGORY = ''  # category used for completed-job revenue rows
+
+def _rollup_delta_sql(table, ref, sign):
+    """Upsert that adds (sign=1) or removes (sign=-1) one row's totals from monthly_financials"""
+    if table == 'transactions':
+        source = f'''
+            SELECT strftime('%Y-%m', {ref}.date) AS month, {ref}.category AS category,
+                   CASE WHEN {ref}.transactionType = 'in' THEN {sign} * {ref}.amount ELSE 0 END AS revenue,
+                   CASE WHEN {ref}.transactionType = 'in' THEN {sign} ELSE 0 END AS revenueCount,
+                   CASE WHEN {ref}.transactionType = 'out' THEN {sign} * {ref}.amount ELSE 0 END AS expenses,
+                   CASE WHEN {ref}.transactionType = 'out' THEN {sign} ELSE 0 END AS expenseCount,
+                   0 AS jobsRevenue, 0 AS jobsCount
+        '''
+    else:
+        source = f'''
+            SELECT strftime('%Y-%m', {ref}.startDate) AS month, '{JOBS_ROLLUP_CATEGORY}' AS category,
+                   0 AS revenue, 0 AS revenueCount, 0 AS expenses, 0 AS expenseCount,
+                   {sign} * {ref}.value AS jobsRevenue, {sign} AS jobsCount
+            WHERE {ref}.status = 'completed' AND {ref}.value IS NOT NULL
+        '''
+    return f'''
+        INSERT INTO monthly_financials
+            (month, category, revenue, revenueCount, expenses, expenseCount, jobsRevenue, jobsCount)
+        SELECT * FROM ({source}) WHERE month IS NOT NULL
+        ON CONFLICT(month, category) DO UPDATE SET
+            revenue = revenue + excluded.revenue,
+            revenueCount = revenueCount + excluded.revenueCount,
+            expenses = expenses + excluded.expenses,
+            expenseCount = expenseCount + excluded.expenseCount,
+            jobsRevenue = jobsRevenue + excluded.jobsRevenue,
+            jobsCount = jobsCount + excluded.jobsCount;
+    '''
+
+def _create_monthly_rollup(conn):
+    """Create monthly_financials, its maintenance triggers, and rebuild it from source"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS monthly_financials (
+            month TEXT NOT NULL,
+            category TEXT NOT NULL,
+            revenue REAL NOT NULL DEFAULT 0,
+            revenueCount INTEGER NOT NULL DEFAULT 0,
+            expenses REAL NOT NULL DEFAULT 0,
+            expenseCount INTEGER NOT NULL DEFAULT 0,
+            jobsRevenue REAL NOT NULL DEFAULT 0,
+            jobsCount INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (month, category)
+        ) WITHOUT ROWID
+    ''')
+    watched_columns = {
+        'transactions': ['transactionType', 'category', 'amount', 'date'],
+        'jobs': ['status', 'value', 'startDate'],
+    }
+    for table, columns in watched_columns.items():
+        changed = ' OR '.join(f'OLD.{col} IS NOT NEW.{col}' for col in columns)
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_insert_rollup AFTER INSERT ON {table}
+            BEGIN {_rollup_delta_sql(table, 'NEW', 1)} END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_update_rollup AFTER UPDATE ON {table}
+            WHEN {changed}
+            BEGIN {_rollup_delta_sql(table, 'OLD', -1)} {_rollup_delta_sql(table, 'NEW', 1)} END
+        ''')
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_delete_rollup AFTER DELETE ON {table}
+            BEGIN {_rollup_delta_sql(table, 'OLD', -1)} END
+        ''')
+    rebuild_monthly_financials(conn)
+
+def rebuild_monthly_financials(conn):
+    """Recompute monthly_financials from transactions and jobs"""
+    conn.execute('DELETE FROM monthly_financials')
+    conn.execute('''
+        INSERT INTO monthly_financials
+            (month, category, revenue, revenueCount, expenses, expenseCount, jobsRevenue, jobsCount)
+        SELECT strftime('%Y-%m', date), category,
+               SUM(CASE WHEN transactionType = 'in' THEN amount ELSE 0 END),
+               SUM(CASE WHEN transactionType = 'in' THEN 1 ELSE 0 END),
+               SUM(CASE WHEN transactionType = 'out' THEN amount ELSE 0 END),
+               SUM(CASE WHEN transactionType = 'out' THEN 1 ELSE 0 END),
+               0, 0
+        FROM transactions
+        WHERE strftime('%Y-%m', date) IS NOT NULL
+        GROUP BY 1, 2
+    ''')
+    conn.execute('''
+        INSERT INTO monthly_financials
+            (month, category, revenue, revenueCount, expenses, expenseCount, jobsRevenue, jobsCount)
+        SELECT strftime('%Y-%m', startDate), ?, 0, 0, 0, 0, SUM(value), COUNT(*)
+        FROM jobs
+        WHERE status = 'completed' AND value IS NOT NULL AND strftime('%Y-%m', startDate) IS NOT NULL
+        GROUP BY 1
+    ''', (JOBS_ROLLUP_CATEGORY,))
+    conn.commit()
+
+def _rollup_summary(cursor, month_filter, params):
+    """Totals and expense categories from monthly_financials for the given month filter"""
+    cursor.execute(f'''
+        SELECT COALESCE(SUM(revenue), 0), COALESCE(SUM(expenses), 0), COALESCE(SUM(jobsRevenue), 0)
+        FROM monthly_financials
+        WHERE 1=1 {month_filter}
+    ''', params)
+    revenue, expenses, jobs_revenue = cursor.fetchone()
+    
+    cursor.execute(f'''
+        SELECT category, SUM(expenses) as total, SUM(expenseCount) as count
+        FROM monthly_financials
+        WHERE expenseCount != 0 {month_filter}
+        GROUP BY category
+        HAVING SUM(expenseCount) > 0
+        ORDER BY total DESC
+    ''', params)
+    expense_categories = [{'category': row[0], 'total': row[1], 'count': row[2]}
+                         for row in cursor.fetchall()]
+    return revenue, expenses, jobs_revenue, expense_categories
+
+# ============================================================================
+# STREAMING EXPORTS
+# ============================================================================
+
+EXPORT_CHUNK_SIZE = 500  # rows fetched from the cursor per yielded chunk
+
+class _LineBuffer:
+    """File-like sink that hands back whatever csv.writer writes to it"""
+    def write(self, value):
+        return value
+
+def iter_query_chunks(sql, params, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield (columns, rows) chunks from a query on a pooled connection held for the iteration"""
+    with db_connection() as conn:
+        cursor = conn.execute(sql, params)
+        columns = [col[0] for col in cursor.description]
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield columns, rows
+
+def stream_csv(sql, params, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield CSV text for a query: the header first, then one block per chunk of rows"""
+    writer = csv.writer(_LineBuffer())
+    header_sent = False
+    for columns, rows in iter_query_chunks(sql, params, chunk_size):
+        if not header_sent:
+            yield writer.writerow(columns)
+            header_sent = True
+        yield ''.join(writer.writerow(tuple(row)) for row in rows)
+
+# ============================================================================
+# RECEIPT STORAGE (content-addressed)
+# ============================================================================
+
+RECEIPT_CHUNK_SIZE = 64 * 1024  # bytes hashed and written per step while an upload streams in
+RECEIPT_NAME_RE = re.compile(r'^[0-9a-f]{64}\.[a-z0-9]+$')
+
+# Held while a stored file is reused or created and while an unreferenced one is
+# removed; uploads stay pinned until their transaction row is committed
+_receipt_lock = threading.Lock()
+_receipt_pins = {}
+
+def is_content_addressed(receipt_path):
+    """True for receipt names of the form <sha256>.<ext>"""
+    return bool(receipt_path and RECEIPT_NAME_RE.match(receipt_path))
+
+def _store_receipt_file(source, extension, pin=False):
+    """Copy a readable binary stream into the receipt folder under its SHA-256 name
+
+    The hash is computed while the data is written to a temporary file, which is
+    then renamed into place, or discarded if identical content is already stored.
+    With pin=True the file is protected from release_receipts until unpin_receipt.
+    """
+    digest = hashlib.sha256()
+    fd, temp_path = tempfile.mkstemp(dir=app.config['UPLOAD_FOLDER'], suffix='.part')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = source.read(RECEIPT_CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+        receipt_path = f'{digest.hexdigest()}.{extension}'
+        final_path = os.path.join(app.config['UPLOAD_FOLDER'], receipt_path)
+        with _receipt_lock:
+            if os.path.exists(final_path):
+                os.remove(temp_path)
+            else:
+                os.replace(temp_path, final_path)
+            if pin:
+                _receipt_pins[receipt_path] = _receipt_pins.get(receipt_path, 0) + 1
+        return receipt_path
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def save_receipt(file):
+    """Store an uploaded receipt by content hash and return its receiptPath, pinned
+
+    Call unpin_receipt once the transaction referencing it is committed (or has failed).
+    """
+    extension = file.filename.rsplit('.', 1)[1].lower()  # already checked by allowed_file
+    return _store_receipt_file(file.stream, extension, pin=True)
+
+def unpin_receipt(receipt_path):
+    """Drop the pin save_receipt took, so the file can be released again"""
+    if not receipt_path:
+        return
+    with _receipt_lock:
+        if _receipt_pins.get(receipt_path, 0) > 1:
+            _receipt_pins[receipt_path] -= 1
+        else:
+            _receipt_pins.pop(receipt_path, None)
+
+def release_receipts(conn, receipt_paths):
+    """Delete stored receipt files that no transaction references any more
+
+    Call after the transaction changes are committed; reference counts are kept
+    in receipt_files by triggers on transactions. The count is re-checked under
+    the store lock, so an upload reusing the same file cannot lose it.
+    """
+    for receipt_path in {path for path in receipt_paths if path}:
+        with _receipt_lock:
+            if _receipt_pins.get(receipt_path):
+                continue
+            row = conn.execute('SELECT refCount FROM receipt_files WHERE receiptPath=?',
+                               (receipt_path,)).fetchone()
+            if row and row['refCount'] > 0:
+                continue
+            conn.execute('DELETE FROM receipt_files WHERE receiptPath=? AND refCount <= 0', (receipt_path,))
+            conn.commit()
+            for file_path in (os.path.join(app.config['UPLOAD_FOLDER'], receipt_path),
+                              os.path.join(THUMBNAIL_FOLDER, thumbnail_name(receipt_path))):
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+
+def _create_receipt_store(conn):
+    """Create receipt_files and its refcount triggers, migrating legacy receipt names"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS receipt_files (
+            receiptPath TEXT PRIMARY KEY,
+            refCount INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    add_ref = '''
+        INSERT INTO receipt_files (receiptPath, refCount) VALUES (NEW.receiptPath, 1)
+        ON CONFLICT(receiptPath) DO UPDATE SET refCount = refCount + 1;
+    '''
+    drop_ref = '''
+        UPDATE receipt_files SET refCount = refCount - 1 WHERE receiptPath = OLD.receiptPath;
+    '''
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_insert_receipt AFTER INSERT ON transactions
+        WHEN NEW.receiptPath IS NOT NULL
+        BEGIN {add_ref} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_delete_receipt AFTER DELETE ON transactions
+        WHEN OLD.receiptPath IS NOT NULL
+        BEGIN {drop_ref} END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_update_receipt_old AFTER UPDATE OF receiptPath ON transactions
+        WHEN OLD.receiptPath IS NOT NEW.receiptPath AND OLD.receiptPath IS NOT NULL
+        BEGIN UPDATE receipt_files SET refCount = refCount - 1 WHERE receiptPath = OLD.receiptPath; END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_transactions_update_receipt_new AFTER UPDATE OF receiptPath ON transactions
+        WHEN OLD.receiptPath IS NOT NEW.receiptPath AND NEW.receiptPath IS NOT NULL
+        BEGIN {add_ref} END
+    ''')
+    migrate_legacy_receipts(conn)
+    rebuild_receipt_refs(conn)
+
+def migrate_legacy_receipts(conn):
+    """Rename <timestamp>_<filename> receipts to content-hash names, merging duplicates"""
+    rows = conn.execute('''
+        SELECT DISTINCT receiptPath FROM transactions WHERE receiptPath IS NOT NULL
+    ''').fetchall()
+    migrated = 0
+    for row in rows:
+        old_path = row['receiptPath']
+        if is_content_addressed(old_path) or '.' not in old_path:
+            continue
+        file_path = os.path.join(app.config['UPLOAD_FOLDER'], old_path)
+        if not os.path.isfile(file_path):
+            continue
+        with open(file_path, 'rb') as f:
+            new_path = _store_receipt_file(f, old_path.rsplit('.', 1)[1].lower())
+        conn.execute('UPDATE transactions SET receiptPath=? WHERE receiptPath=?', (new_path, old_path))
+        conn.commit()
+        os.remove(file_path)
+        migrated += 1
+    if migrated:
+        print(f"📁 Moved {migrated} receipt(s) to content-addressed storage")
+
+def rebuild_receipt_refs(conn):
+    """Recompute receipt reference counts and remove files nothing points to"""
+    conn.execute('DELETE FROM receipt_files')
+    conn.execute('''
+        INSERT INTO receipt_files (receiptPath, refCount)
+        SELECT receiptPath, COUNT(*) FROM transactions
+        WHERE receiptPath IS NOT NULL
+        GROUP BY receiptPath
+    ''')
+    conn.commit()
+    referenced = {row['receiptPath'] for row in conn.execute('SELECT receiptPath FROM receipt_files')}
+    for name in os.listdir(app.config['UPLOAD_FOLDER']):
+        if (is_content_addressed(name) or name.endswith('.part')) and name not in referenced:
+            os.remove(os.path.join(app.config['UPLOAD_FOLDER'], name))
+    thumbnails = {thumbnail_name(path) for path in referenced}
+    for name in os.listdir(THUMBNAIL_FOLDER):
+        if name not in thumbnails:
+            os.remove(os.path.join(THUMBNAIL_FOLDER, name))
+
+# ============================================================================
+# RECEIPT THUMBNAILS
+# ============================================================================
+
+THUMBNAIL_SIZE = (320, 320)  # bounding box; aspect ratio is kept
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_QUALITY = 75
+THUMBNAIL_FORMAT = 'WEBP' if Image is not None and features.check('webp') else 'JPEG'
+THUMBNAIL_EXTENSION = 'webp' if THUMBNAIL_FORMAT == 'WEBP' else 'jpg'
+PDF_THUMBNAIL_SCALE = 0.75  # render scale for page 1; ~450px wide for A4, then shrunk
+
+_thumbnail_executor = ThreadPoolExecutor(max_workers=THUMBNAIL_WORKERS, thread_name_prefix='thumbnail')
+_thumbnail_pending = set()
+_thumbnail_lock = threading.Lock()
+_pdfium_lock = threading.Lock()  # PDFium is not thread-safe; image thumbnails stay parallel
+
+def thumbnail_name(receipt_path):
+    """Thumbnail file name for a stored receipt"""
+    return f"{receipt_path.rsplit('.', 1)[0]}.{THUMBNAIL_EXTENSION}"
+
+def can_thumbnail(receipt_path):
+    """True if a thumbnail can be produced for this receipt with the installed libraries"""
+    if Image is None or not receipt_path or '.' not in receipt_path:
+        return False
+    extension = receipt_path.rsplit('.', 1)[1].lower()
+    return extension != 'pdf' or pdfium is not None
+
+def _open_receipt_image(source_path):
+    """Receipt as a PIL image: the image itself, or page 1 of a PDF"""
+    if source_path.lower().endswith('.pdf'):
+        with _pdfium_lock:
+            pdf = pdfium.PdfDocument(source_path)
+            try:
+                return pdf[0].render(scale=PDF_THUMBNAIL_SCALE).to_pil()
+            finally:
+                pdf.close()
+    image = Image.open(source_path)
+    image.draft('RGB', THUMBNAIL_SIZE)  # lets JPEG decode at reduced size
+    return ImageOps.exif_transpose(image)
+
+def render_thumbnail(receipt_path):
+    """Write the thumbnail for a stored receipt, replacing it atomically"""
+    try:
+        source_path = os.path.join(app.config['UPLOAD_FOLDER'], receipt_path)
+        target_path = os.path.join(THUMBNAIL_FOLDER, thumbnail_name(receipt_path))
+        if os.path.exists(target_path) or not os.path.exists(source_path):
+            return
+        image = _open_receipt_image(source_path)
+        image.thumbnail(THUMBNAIL_SIZE)
+        keep_alpha = THUMBNAIL_FORMAT == 'WEBP' and ('A' in image.mode or 'transparency' in image.info)
+        image = image.convert('RGBA' if keep_alpha else 'RGB')
+        
+        fd, temp_path = tempfile.mkstemp(dir=THUMBNAIL_FOLDER, suffix='.part')
+        with os.fdopen(fd, 'wb') as out:
+            image.save(out, THUMBNAIL_FORMAT, quality=THUMBNAIL_QUALITY)
+        os.replace(temp_path, target_path)
+    except Exception as e:
+        print(f"⚠️ Could not create thumbnail for {receipt_path}: {e}")
+    finally:
+        with _thumbnail_lock:
+            _thumbnail_pending.discard(receipt_path)
+
+def queue_thumbnail(receipt_path):
+    """Schedule a thumbnail for a receipt on the background pool, once"""
+    if not can_thumbnail(receipt_path):
+        return
+    if os.path.exists(os.path.join(THUMBNAIL_FOLDER, thumbnail_name(receipt_path))):
+        return
+    with _thumbnail_lock:
+        if receipt_path in _thumbnail_pending:
+            return
+        _thumbnail_pending.add(receipt_path)
+    _thumbnail_executor.submit(render_thumbnail, receipt_path)
+
+def queue_missing_thumbnails(conn):
+    """Queue thumbnails for stored receipts that do not have one yet"""
+    for row in conn.execute('SELECT receiptPath FROM receipt_files'):
+        queue_thumbnail(row['receiptPath'])
+
+# ============================================================================
+# PARTIAL UPDATES (PATCH)
+# ============================================================================
+
+READ_ONLY_COLUMNS = {'id', 'createdAt', 'updatedAt'}
+PATCH_EXCLUDED_COLUMNS = {
+    'transactions': {'receiptPath'},  # managed by the receipt upload routes
+    'jobs': {'importKey'},  # dedup key maintained by the CSV importer
+}
+
+_patchable_columns = {}
+
+def patchable_columns(conn, table):
+    """Columns of table a PATCH may set, generated once from the live schema"""
+    if table not in _patchable_columns:
+        excluded = READ_ONLY_COLUMNS | PATCH_EXCLUDED_COLUMNS.get(table, set())
+        columns = [row['name'] for row in conn.execute(f'PRAGMA table_info({table})')]
+        _patchable_columns[table] = [col for col in columns if col not in excluded]
+    return _patchable_columns[table]
+
+def _stored_form(value):
+    """Value as SQLite would store it, for change detection"""
+    return int(value) if isinstance(value, bool) else value
+
+def patch_row(table, row_id, data):
+    """Update only the supplied columns of one row, skipping the write if nothing changed"""
+    if not isinstance(data, dict) or not data:
+        return jsonify({'error': 'No fields provided'}), 400
+    
+    conn = get_db()
+    allowed = patchable_columns(conn, table)
+    fields = {key: value for key, value in data.items() if key not in READ_ONLY_COLUMNS}
+    unknown = [key for key in fields if key not in allowed]
+    if unknown:
+        return jsonify({'error': f'Unsupported fields: {", ".join(unknown)}'}), 400
+    nested = [key for key, value in fields.items() if isinstance(value, (dict, list))]
+    if nested:
+        return jsonify({'error': f'Fields must be plain values: {", ".join(nested)}'}), 400
+    
+    for column in DATE_COLUMNS.get(table, []):
+        if column in fields:
+            fields[column] = normalize_date(fields[column])
+    
+    current = conn.execute(f'SELECT * FROM {table} WHERE id=?', (row_id,)).fetchone()
+    if current is None:
+        return jsonify({'error': 'Not found'}), 404
+    
+    changes = {key: _stored_form(value) for key, value in fields.items()
+               if current[key] != _stored_form(value)}
+    if not changes:
+        return jsonify({'message': 'No changes', 'updated': False, 'fields': []})
+    
+    set_clause = ', '.join(f'{column}=?' for column in changes)
+    if 'updatedAt' in current.keys():
+        set_clause += ', updatedAt=CURRENT_TIMESTAMP'
+    try:
+        conn.execute(f'UPDATE {table} SET {set_clause} WHERE id=?', list(changes.values()) + [row_id])
+        conn.commit()
+    except sqlite3.IntegrityError as e:
+        conn.rollback()
+        return jsonify({'error': f'Update conflicts with an existing record: {str(e)}'}), 400
+    
+    return jsonify({'message': 'Updated successfully', 'updated': True, 'fields': list(changes)})
 
 # ============================================================================
 # FINANCIAL TRANSACTIONS API
 # ============================================================================
 
 @app.route('/api/transactions', methods=['GET'])
+@conditional_on('transactions')
 def get_transactions():
-    """Get all transactions with optional filtering"""
+    """Get transactions with optional filtering and keyset pagination"""
     transaction_type = request.args.get('type')  # 'in' or 'out'
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
     
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+    try:
+        date_range = date_range_from_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    query = 'SELECT * FROM transactions WHERE 1=1'
-    params = []
+    where, params = date_range_filter('date', date_range)
     
     if transaction_type:
-        query += ' AND transactionType=?'
+        where += ' AND transactionType=?'
         params.append(transaction_type)
     
-    if start_date:
-        query += ' AND date >= ?'
-        params.append(start_date)
-    
-    if end_date:
-        query += ' AND date <= ?'
-        params.append(end_date)
-    
-    query += ' ORDER BY date DESC, createdAt DESC'
-    
-    cursor.execute(query, params)
-    transactions = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return jsonify(transactions)
+    return list_rows(get_db(), 'transactions', 'date', where, params)
 
 @app.route('/api/transactions', methods=['POST'])
 def create_transaction():
     """Create a new financial transaction with optional receipt upload"""
+    receipt_path = None
     try:
         # Handle multipart form data
         transaction_type = request.form.get('transactionType')
         category = request.form.get('category')
         amount = float(request.form.get('amount'))
-        date = request.form.get('date')
+        date = normalize_date(request.form.get('date'))
         description = request.form.get('description')
         reference = request.form.get('reference', '')
         linked_job_id = request.form.get('linkedJobId')
@@ -207,14 +1253,9 @@ def create_transaction():
         if 'receipt' in request.files:
             file = request.files['receipt']
             if file and file.filename and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                filename = f"{timestamp}_{filename}"
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(file_path)
-                receipt_path = filename
+                receipt_path = save_receipt(file)
         
-        conn = sqlite3.connect(DB_PATH)
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute('''
             INSERT INTO transactions (transactionType, category, amount, date, description, 
@@ -224,7 +1265,7 @@ def create_transaction():
               receipt_path, linked_job_id, notes))
         conn.commit()
         transaction_id = cursor.lastrowid
-        conn.close()
+        queue_thumbnail(receipt_path)
         
         return jsonify({
             'id': transaction_id, 
@@ -234,46 +1275,37 @@ def create_transaction():
         
     except Exception as e:
         return jsonify({'error': f'Error creating transaction: {str(e)}'}), 400
+    finally:
+        unpin_receipt(receipt_path)
 
 @app.route('/api/transactions/<int:transaction_id>', methods=['PUT'])
 def update_transaction(transaction_id):
     """Update an existing transaction"""
+    uploaded_path = None
     try:
         transaction_type = request.form.get('transactionType')
         category = request.form.get('category')
         amount = float(request.form.get('amount'))
-        date = request.form.get('date')
+        date = normalize_date(request.form.get('date'))
         description = request.form.get('description')
         reference = request.form.get('reference', '')
         linked_job_id = request.form.get('linkedJobId')
         notes = request.form.get('notes', '')
         
         # Get existing transaction to check for receipt
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute('SELECT receiptPath FROM transactions WHERE id=?', (transaction_id,))
         existing = cursor.fetchone()
         
-        receipt_path = existing['receiptPath'] if existing else None
+        old_receipt_path = existing['receiptPath'] if existing else None
+        receipt_path = old_receipt_path
         
         # Handle new file upload
         if 'receipt' in request.files:
             file = request.files['receipt']
             if file and file.filename and allowed_file(file.filename):
-                # Delete old receipt if exists
-                if receipt_path:
-                    old_path = os.path.join(app.config['UPLOAD_FOLDER'], receipt_path)
-                    if os.path.exists(old_path):
-                        os.remove(old_path)
-                
-                # Save new receipt
-                filename = secure_filename(file.filename)
-                timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-                filename = f"{timestamp}_{filename}"
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-                file.save(file_path)
-                receipt_path = filename
+                receipt_path = uploaded_path = save_receipt(file)
         
         cursor.execute('''
             UPDATE transactions 
@@ -283,63 +1315,153 @@ def update_transaction(transaction_id):
         ''', (transaction_type, category, amount, date, description, reference,
               receipt_path, linked_job_id, notes, transaction_id))
         conn.commit()
-        conn.close()
+        
+        # The old file goes only if no other transaction shares it
+        if old_receipt_path != receipt_path:
+            release_receipts(conn, [old_receipt_path])
+            queue_thumbnail(receipt_path)
         
         return jsonify({'message': 'Transaction updated successfully'})
         
     except Exception as e:
         return jsonify({'error': f'Error updating transaction: {str(e)}'}), 400
+    finally:
+        unpin_receipt(uploaded_path)
+
+@app.route('/api/transactions/<int:transaction_id>', methods=['PATCH'])
+def patch_transaction(transaction_id):
+    """Update only the supplied transaction fields (JSON, no receipt upload)"""
+    return patch_row('transactions', transaction_id, request.json)
 
 @app.route('/api/transactions/<int:transaction_id>', methods=['DELETE'])
 def delete_transaction(transaction_id):
-    """Delete a transaction and its receipt file"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    """Delete a transaction and its receipt file, unless another transaction shares it"""
+    conn = get_db()
     cursor = conn.cursor()
     
     # Get receipt path before deleting
     cursor.execute('SELECT receiptPath FROM transactions WHERE id=?', (transaction_id,))
     transaction = cursor.fetchone()
     
-    if transaction and transaction['receiptPath']:
-        receipt_path = os.path.join(app.config['UPLOAD_FOLDER'], transaction['receiptPath'])
-        if os.path.exists(receipt_path):
-            os.remove(receipt_path)
-    
     cursor.execute('DELETE FROM transactions WHERE id=?', (transaction_id,))
     conn.commit()
-    conn.close()
+    
+    if transaction:
+        release_receipts(conn, [transaction['receiptPath']])
     
     return jsonify({'message': 'Transaction deleted successfully'})
 
+RECEIPT_MAX_AGE = 31536000  # one year; content-addressed files never change
+
+def send_receipt_file(directory, name, etag=None):
+    """Send a stored receipt or thumbnail with validators and Range support
+
+    With an etag (a content hash) the file is treated as immutable and cached for
+    a year. send_from_directory handles If-None-Match, Range/If-Range and hands
+    the open file to the server's wsgi.file_wrapper, which uses sendfile where
+    the server supports it.
+    """
+    if etag:
+        response = send_from_directory(directory, name, etag=etag, max_age=RECEIPT_MAX_AGE,
+                                       conditional=True)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+    else:
+        # Legacy names may be reused for different content, so always revalidate
+        response = send_from_directory(directory, name, conditional=True)
+        response.cache_control.no_cache = True
+    return response
+
 @app.route('/api/transactions/receipts/<filename>', methods=['GET'])
 def get_receipt(filename):
     """Serve uploaded receipt files"""
+    etag = filename.rsplit('.', 1)[0] if is_content_addressed(filename) else None
     try:
-        return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
-    except:
+        return send_receipt_file(app.config['UPLOAD_FOLDER'], filename, etag)
+    except NotFound:
         return jsonify({'error': 'Receipt not found'}), 404
 
+@app.route('/api/transactions/receipts/<filename>/thumbnail', methods=['GET'])
+def get_receipt_thumbnail(filename):
+    """Serve a receipt's thumbnail; content-addressed, so it can be cached for a year"""
+    if not is_content_addressed(filename):
+        return jsonify({'error': 'Thumbnail not available'}), 404
+    
+    thumbnail = thumbnail_name(filename)
+    if os.path.exists(os.path.join(THUMBNAIL_FOLDER, thumbnail)):
+        return send_receipt_file(THUMBNAIL_FOLDER, thumbnail, f"{filename.rsplit('.', 1)[0]}-thumb")
+    
+    # Not rendered yet (or from before thumbnails existed): queue it for next time
+    if os.path.exists(os.path.join(app.config['UPLOAD_FOLDER'], filename)):
+        queue_thumbnail(filename)
+    return jsonify({'error': 'Thumbnail not available'}), 404
+
 @app.route('/api/financial-summary', methods=['GET'])
+@conditional_on('transactions', 'jobs')
 def get_financial_summary():
-    """Get financial summary with revenue, expenses, and profit"""
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
+    """Get financial summary with revenue, expenses, and profit
+
+    Accepts year, year+quarter, month or start_date/end_date.
+    """
     year = request.args.get('year')
+    try:
+        date_range = date_range_from_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
     
-    # Build date filter
-    date_filter = ''
-    params = []
+    if date_range is None or is_month_aligned(date_range):
+        # Whole months (years, quarters) and all-time totals come from the monthly rollup
+        month_range = tuple(bound[:7] if bound else None for bound in date_range or (None, None))
+        month_filter, month_params = date_range_filter('month', month_range)
+        revenue, expenses, jobs_revenue, expense_categories = _rollup_summary(
+            cursor, month_filter, month_params)
+    else:
+        revenue, expenses, jobs_revenue, expense_categories = _range_summary(
+            cursor, date_range)
+    
+    # Get monthly breakdown of the requested year or quarter
+    monthly_data = []
+    if year and not request.args.get('month'):
+        first_month, end_month = (bound[:7] for bound in date_range)
+        cursor.execute('''
+            SELECT month, SUM(revenue), SUM(expenses)
+            FROM monthly_financials
+            WHERE month >= ? AND month < ?
+            GROUP BY month
+        ''', (first_month, end_month))
+        totals_by_month = {row[0]: (row[1], row[2]) for row in cursor.fetchall()}
+        for month in range(int(first_month[5:]), 13):
+            month_str = f"{first_month[:4]}-{month:02d}"
+            if month_str >= end_month:
+                break
+            month_revenue, month_expenses = totals_by_month.get(month_str, (0, 0))
+            monthly_data.append({
+                'month': month_str,
+                'revenue': month_revenue,
+                'expenses': month_expenses,
+                'profit': month_revenue - month_expenses
+            })
     
-    if year:
-        date_filter = " AND strftime('%Y', date) = ?"
-        params.append(year)
-    elif start_date and end_date:
-        date_filter = " AND date BETWEEN ? AND ?"
-        params.extend([start_date, end_date])
+    total_revenue = revenue + jobs_revenue
+    profit = total_revenue - expenses
+    
+    return jsonify({
+        'revenue': total_revenue,
+        'manual_revenue': revenue,
+        'jobs_revenue': jobs_revenue,
+        'expenses': expenses,
+        'profit': profit,
+        'expense_categories': expense_categories,
+        'monthly_data': monthly_data
+    })
+
+def _range_summary(cursor, date_range):
+    """Totals and expense categories for an arbitrary date range, from the base tables"""
+    date_filter, params = date_range_filter('date', date_range)
+    start_filter, start_params = date_range_filter('startDate', date_range)
     
     # Calculate total revenue (money in)
     cursor.execute(f'''
@@ -361,8 +1483,8 @@ def get_financial_summary():
     cursor.execute(f'''
         SELECT COALESCE(SUM(value), 0) as total
         FROM jobs 
-        WHERE status = 'completed' AND value IS NOT NULL {date_filter.replace('date', 'startDate')}
-    ''', params)
+        WHERE status = 'completed' AND value IS NOT NULL {start_filter}
+    ''', start_params)
     jobs_revenue = cursor.fetchone()[0]
     
     # Get category breakdown for expenses
@@ -376,114 +1498,147 @@ def get_financial_summary():
     expense_categories = [{'category': row[0], 'total': row[1], 'count': row[2]} 
                          for row in cursor.fetchall()]
     
-    # Get monthly breakdown if year specified
-    monthly_data = []
-    if year:
-        for month in range(1, 13):
-            month_str = f"{year}-{month:02d}"
-            cursor.execute('''
-                SELECT 
-                    COALESCE(SUM(CASE WHEN transactionType='in' THEN amount ELSE 0 END), 0) as revenue,
-                    COALESCE(SUM(CASE WHEN transactionType='out' THEN amount ELSE 0 END), 0) as expenses
-                FROM transactions 
-                WHERE strftime('%Y-%m', date) = ?
-            ''', (month_str,))
-            row = cursor.fetchone()
-            monthly_data.append({
-                'month': month_str,
-                'revenue': row[0],
-                'expenses': row[1],
-                'profit': row[0] - row[1]
-            })
-    
-    conn.close()
-    
-    total_revenue = revenue + jobs_revenue
-    profit = total_revenue - expenses
-    
-    return jsonify({
-        'revenue': total_revenue,
-        'manual_revenue': revenue,
-        'jobs_revenue': jobs_revenue,
-        'expenses': expenses,
-        'profit': profit,
-        'expense_categories': expense_categories,
-        'monthly_data': monthly_data
-    })
+    return revenue, expenses, jobs_revenue, expense_categories
 
 @app.route('/api/financial-report', methods=['GET'])
 def generate_financial_report():
-    """Generate comprehensive financial report for printing"""
+    """Generate comprehensive financial report for printing
+
+    format=json (default) returns one document; format=ndjson or format=csv
+    streams the rows straight from the cursor. Totals always come from a
+    single SQL aggregate.
+    """
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
+    report_format = request.args.get('format', 'json')
+    
+    if not start_date or not end_date:
+        return jsonify({'error': 'Start date and end date required'}), 400
+    if report_format not in ('json', 'ndjson', 'csv'):
+        return jsonify({'error': 'format must be json, ndjson or csv'}), 400
+    
+    try:
+        date_range = date_range_from_args({'start_date': start_date, 'end_date': end_date})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    date_filter, params = date_range_filter('date', date_range)
+    start_filter, start_params = date_range_filter('startDate', date_range)
+    
+    conn = get_db()
+    cursor = conn.cursor()
+    
+    totals = _report_totals(cursor, date_filter, params, start_filter, start_params)
+    period = {'start': start_date, 'end': end_date}
+    
+    transactions_sql = f'''
+        SELECT * FROM transactions 
+        WHERE 1=1 {date_filter}
+        ORDER BY date DESC, transactionType
+    '''
+    jobs_sql = f'''
+        SELECT * FROM jobs 
+        WHERE status = 'completed' {start_filter}
+        ORDER BY startDate DESC
+    '''
+    filename = f'financial_report_{date_range[0]}_{normalize_date(end_date)}'
     
-    if not start_date or not end_date:
-        return jsonify({'error': 'Start date and end date required'}), 400
+    if report_format == 'ndjson':
+        response = Response(
+            _stream_report_ndjson(period, totals, transactions_sql, params, jobs_sql, start_params),
+            mimetype='application/x-ndjson')
+        response.headers['Content-Disposition'] = f'attachment; filename={filename}.ndjson'
+        return response
     
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+    if report_format == 'csv':
+        response = Response(
+            _stream_report_csv(totals, date_filter, params, start_filter, start_params),
+            mimetype='text/csv')
+        response.headers['Content-Disposition'] = f'attachment; filename={filename}.csv'
+        return response
     
     # Get all transactions in date range
-    cursor.execute('''
-        SELECT * FROM transactions 
-        WHERE date BETWEEN ? AND ?
-        ORDER BY date DESC, transactionType
-    ''', (start_date, end_date))
+    cursor.execute(transactions_sql, params)
     transactions = [dict(row) for row in cursor.fetchall()]
     
     # Get completed jobs in date range
-    cursor.execute('''
-        SELECT * FROM jobs 
-        WHERE status = 'completed' AND startDate BETWEEN ? AND ?
-        ORDER BY startDate DESC
-    ''', (start_date, end_date))
+    cursor.execute(jobs_sql, start_params)
     completed_jobs = [dict(row) for row in cursor.fetchall()]
     
-    # Calculate totals
-    revenue_in = sum(t['amount'] for t in transactions if t['transactionType'] == 'in')
-    expenses_out = sum(t['amount'] for t in transactions if t['transactionType'] == 'out')
-    jobs_revenue = sum(j['value'] or 0 for j in completed_jobs)
-    total_revenue = revenue_in + jobs_revenue
-    profit = total_revenue - expenses_out
-    
-    conn.close()
-    
     return jsonify({
-        'period': {
-            'start': start_date,
-            'end': end_date
-        },
+        'period': period,
         'transactions': transactions,
         'completed_jobs': completed_jobs,
-        'totals': {
-            'revenue': total_revenue,
-            'manual_revenue': revenue_in,
-            'jobs_revenue': jobs_revenue,
-            'expenses': expenses_out,
-            'profit': profit
-        }
+        'totals': totals
     })
 
+def _report_totals(cursor, date_filter, params, start_filter, start_params):
+    """Revenue, expenses and profit for the report period in one aggregate query"""
+    cursor.execute(f'''
+        SELECT
+            COALESCE(SUM(CASE WHEN kind = 'in' THEN amount END), 0),
+            COALESCE(SUM(CASE WHEN kind = 'out' THEN amount END), 0),
+            COALESCE(SUM(CASE WHEN kind = 'job' THEN amount END), 0)
+        FROM (
+            SELECT transactionType AS kind, amount FROM transactions WHERE 1=1 {date_filter}
+            UNION ALL
+            SELECT 'job' AS kind, value AS amount FROM jobs WHERE status = 'completed' {start_filter}
+        )
+    ''', list(params) + list(start_params))
+    revenue_in, expenses_out, jobs_revenue = cursor.fetchone()
+    total_revenue = revenue_in + jobs_revenue
+    return {
+        'revenue': total_revenue,
+        'manual_revenue': revenue_in,
+        'jobs_revenue': jobs_revenue,
+        'expenses': expenses_out,
+        'profit': total_revenue - expenses_out
+    }
+
+def _stream_report_ndjson(period, totals, transactions_sql, params, jobs_sql, start_params):
+    """Yield the report as NDJSON: a summary line, then one line per transaction and job"""
+    yield json.dumps({'type': 'summary', 'period': period, 'totals': totals}) + '\n'
+    for record_type, sql, sql_params in (('transaction', transactions_sql, params),
+                                         ('job', jobs_sql, start_params)):
+        for columns, rows in iter_query_chunks(sql, sql_params):
+            yield ''.join(
+                json.dumps({'type': record_type, **dict(zip(columns, row))}) + '\n'
+                for row in rows
+            )
+
+def _stream_report_csv(totals, date_filter, params, start_filter, start_params):
+    """Yield the report as CSV: transactions and completed jobs in one table, then the totals"""
+    sql = f'''
+        SELECT * FROM (
+            SELECT 'transaction' AS record, date, transactionType AS type, category, description,
+                   reference, amount, linkedJobId AS jobId
+            FROM transactions WHERE 1=1 {date_filter}
+            UNION ALL
+            SELECT 'job' AS record, startDate AS date, 'in' AS type, 'Completed job' AS category,
+                   clientName || ' - ' || location AS description, jobNumber AS reference,
+                   value AS amount, id AS jobId
+            FROM jobs WHERE status = 'completed' {start_filter}
+        )
+        ORDER BY date DESC, record DESC, type
+    '''
+    yield from stream_csv(sql, list(params) + list(start_params))
+    writer = csv.writer(_LineBuffer())
+    yield ''.join(writer.writerow(['total', '', '', name, '', '', value, ''])
+                  for name, value in totals.items())
+
 # ============================================================================
 # EXISTING API ROUTES (Invoices, Inquiries, Jobs, Vehicles)
 # ============================================================================
 
 # API Routes - Invoices
 @app.route('/api/invoices', methods=['GET'])
+@conditional_on('invoices')
 def get_invoices():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM invoices ORDER BY date DESC')
-    invoices = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return jsonify(invoices)
+    return list_rows(get_db(), 'invoices', 'date')
 
 @app.route('/api/invoices', methods=['POST'])
 def create_invoice():
     data = request.json
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
     try:
         vat_applied = data.get('vatApplied', True)
@@ -497,25 +1652,22 @@ def create_invoice():
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
             data['invoiceNumber'], data['clientName'], data.get('clientAddress'),
-            data.get('clientPhone'), data['date'], data['status'], data['items'],
+            data.get('clientPhone'), normalize_date(data['date']), data['status'], data['items'],
             data['subtotal'], vat, vat_applied, data['total'], data.get('notes'),
             data.get('linkedJobId')
         ))
         conn.commit()
         invoice_id = cursor.lastrowid
-        conn.close()
         return jsonify({'id': invoice_id, 'message': 'Invoice created successfully'}), 201
     except sqlite3.IntegrityError:
-        conn.close()
         return jsonify({'error': 'Invoice number already exists'}), 400
     except Exception as e:
-        conn.close()
         return jsonify({'error': f'Error creating invoice: {str(e)}'}), 400
 
 @app.route('/api/invoices/<int:invoice_id>', methods=['PUT'])
 def update_invoice(invoice_id):
     data = request.json
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
     
     vat_applied = data.get('vatApplied', True)
@@ -530,620 +1682,441 @@ def update_invoice(invoice_id):
         WHERE id=?
     ''', (
         data['invoiceNumber'], data['clientName'], data.get('clientAddress'),
-        data.get('clientPhone'), data['date'], data['status'], data['items'],
+        data.get('clientPhone'), normalize_date(data['date']), data['status'], data['items'],
         data['subtotal'], vat, vat_applied, data['total'], data.get('notes'), 
         data.get('linkedJobId'), invoice_id
     ))
     conn.commit()
-    conn.close()
     return jsonify({'message': 'Invoice updated successfully'})
 
+@app.route('/api/invoices/<int:invoice_id>', methods=['PATCH'])
+def patch_invoice(invoice_id):
+    data = request.json
+    if isinstance(data, dict) and 'vatApplied' in data and not data['vatApplied']:
+        data['vat'] = 0
+    return patch_row('invoices', invoice_id, data)
+
 @app.route('/api/invoices/<int:invoice_id>', methods=['DELETE'])
 def delete_invoice(invoice_id):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute('DELETE FROM invoices WHERE id=?', (invoice_id,))
     conn.commit()
-    conn.close()
     return jsonify({'message': 'Invoice deleted successfully'})
 
+# ============================================================================
+# INVOICE PREVIEW
+# ============================================================================
+
+PREVIEW_CACHE_SIZE = 128  # rendered invoice pages kept in memory
+PREVIEW_CSS_FILE = 'invoice_preview.css'
+
+_preview_cache = OrderedDict()
+_preview_cache_lock = threading.Lock()
+
+@app.template_filter('money')
+def money_filter(value):
+    """Format an amount the way invoices print it, e.g. £1,250"""
+    return f"£{value or 0:,.0f}"
+
+def _static_version(filename):
+    """Short content hash of a static file, used to bust long-lived browser caches"""
+    with open(os.path.join(app.static_folder, filename), 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()[:10]
+
+PREVIEW_CSS_VERSION = _static_version(PREVIEW_CSS_FILE)
+
+def invoice_digest(invoice):
+    """Digest of an invoice row; changes whenever any stored field changes"""
+    payload = json.dumps(invoice, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha1(payload).hexdigest()[:16]
+
+def invoice_context(invoice):
+    """Template context for one invoice page: parsed items with line amounts"""
+    items = []
+    for item in json.loads(invoice['items'] or '[]'):
+        quantity = item.get('quantity', 1)
+        rate = item.get('rate', 0)
+        items.append({'description': item.get('description', ''), 'quantity': quantity,
+                      'rate': rate, 'amount': quantity * rate})
+    invoice_date = datetime.strptime(invoice['date'], '%Y-%m-%d').strftime('%d/%m/%Y')
+    return {'invoice': invoice, 'items': items, 'invoice_date': invoice_date}
+
+def cached_preview(invoice, digest):
+    """Rendered preview HTML for an invoice, reused until the row changes"""
+    key = (invoice['id'], digest)
+    with _preview_cache_lock:
+        html = _preview_cache.get(key)
+        if html is not None:
+            _preview_cache.move_to_end(key)
+            return html
+    
+    html = render_template('invoice_preview.html', css_version=PREVIEW_CSS_VERSION,
+                           **invoice_context(invoice))
+    with _preview_cache_lock:
+        _preview_cache[key] = html
+        _preview_cache.move_to_end(key)
+        while len(_preview_cache) > PREVIEW_CACHE_SIZE:
+            _preview_cache.popitem(last=False)
+    return html
+
+@app.route('/api/invoices/preview.css', methods=['GET'])
+def invoice_preview_css():
+    """Invoice stylesheet; URLs carry a content version so it can be cached forever"""
+    response = send_from_directory(app.static_folder, PREVIEW_CSS_FILE, max_age=31536000)
+    response.cache_control.immutable = True
+    return response
+
 @app.route('/api/invoices/<int:invoice_id>/preview', methods=['GET'])
 def preview_invoice(invoice_id):
     """Generate professional HTML invoice preview - single page, print-ready"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM invoices WHERE id=?', (invoice_id,))
         invoice_row = cursor.fetchone()
-        conn.close()
         
         if not invoice_row:
             return jsonify({'error': 'Invoice not found'}), 404
         
         invoice = dict(invoice_row)
-        items = json.loads(invoice['items'])
-        
-        invoice_date = datetime.strptime(invoice['date'], '%Y-%m-%d').strftime('%d/%m/%Y')
-        
-        # Build items HTML
-        items_html = ''
-        for idx, item in enumerate(items, 1):
-            amount = item.get('quantity', 1) * item.get('rate', 0)
-            items_html += f'''
-                <tr>
-                    <td style="width: 40px; text-align: center; padding: 8px;">{idx}</td>
-                    <td style="padding: 8px;">{item['description']}</td>
-                    <td style="text-align: center; padding: 8px;">{item.get('quantity', 1)}</td>
-                    <td style="text-align: right; padding: 8px;">£{item.get('rate', 0):,.0f}</td>
-                    <td style="text-align: right; padding: 8px;">£{amount:,.0f}</td>
-                </tr>
-'''
-        
-        html = f'''
-<!DOCTYPE html>
-<html>
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Invoice {invoice['invoiceNumber']} - Khalsa Scaffolding LTD</title>
-    <style>
-        @page {{
-            margin: 15mm;
-            size: A4 portrait;
-        }}
-        * {{
-            margin: 0;
-            padding: 0;
-            box-sizing: border-box;
-        }}
-        body {{
-            font-family: 'Calibri', 'Arial', sans-serif;
-            font-size: 10pt;
-            color: #000;
-            background: #f5f5f5;
-            padding: 15px;
-        }}
-        .page-wrapper {{
-            max-width: 210mm;
-            margin: 0 auto;
-            background: white;
-            box-shadow: 0 0 15px rgba(0,0,0,0.1);
-        }}
-        .invoice-container {{
-            padding: 20px 30px;
-            background: white;
-        }}
-        
-        /* Action Buttons */
-        .action-bar {{
-            background: #4472C4;
-            padding: 12px 30px;
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            color: white;
-        }}
-        .action-bar h2 {{
-            font-size: 14pt;
-            font-weight: normal;
-        }}
-        .action-btn {{
-            background: white;
-            color: #4472C4;
-            border: none;
-            padding: 8px 18px;
-            border-radius: 4px;
-            cursor: pointer;
-            font-size: 10pt;
-            font-weight: bold;
-            transition: all 0.2s;
-        }}
-        .action-btn:hover {{
-            background: #f0f0f0;
-            transform: translateY(-1px);
-        }}
-        
-        /* Header */
-        .header {{
-            display: flex;
-            justify-content: space-between;
-            margin-bottom: 20px;
-            padding-bottom: 12px;
-            border-bottom: 2px solid #4472C4;
-        }}
-        .company-info {{
-            flex: 1;
-        }}
-        .company-name {{
-            font-size: 16pt;
-            font-weight: bold;
-            color: #000;
-            margin-bottom: 4px;
-        }}
-        .company-details {{
-            font-size: 9pt;
-            line-height: 1.4;
-            color: #333;
-        }}
-        .invoice-title {{
-            text-align: right;
-        }}
-        .invoice-title h1 {{
-            font-size: 28pt;
-            font-weight: bold;
-            color: #000;
-            margin-bottom: 0;
-        }}
-        
-        /* Invoice Meta */
-        .invoice-meta {{
-            display: grid;
-            grid-template-columns: 1fr 1fr;
-            gap: 20px;
-            margin: 15px 0;
-        }}
-        .meta-section {{
-            background: #fafafa;
-            padding: 12px;
-            border-left: 3px solid #4472C4;
-        }}
-        .meta-section h3 {{
-            font-size: 9pt;
-            font-weight: bold;
-            margin-bottom: 6px;
-            color: #000;
-            text-transform: uppercase;
-        }}
-        .meta-section p {{
-            font-size: 9pt;
-            line-height: 1.4;
-            margin: 2px 0;
-        }}
-        .meta-label {{
-            display: inline-block;
-            width: 70px;
-            font-weight: bold;
-        }}
-        
-        /* Items Table */
-        .items-table {{
-            width: 100%;
-            border-collapse: collapse;
-            margin: 15px 0;
-        }}
-        .items-table thead {{
-            background: #4472C4;
-            color: white;
-        }}
-        .items-table th {{
-            padding: 8px;
-            text-align: left;
-            font-weight: bold;
-            font-size: 9pt;
-            text-transform: uppercase;
-        }}
-        .items-table tbody td {{
-            padding: 8px;
-            border-bottom: 1px solid #e0e0e0;
-            font-size: 9pt;
-        }}
-        .items-table tbody tr:last-child td {{
-            border-bottom: 2px solid #4472C4;
-        }}
-        
-        /* Totals */
-        .totals-section {{
-            margin-top: 15px;
-            display: flex;
-            justify-content: space-between;
-            align-items: flex-start;
-        }}
-        .thank-you {{
-            flex: 1;
-            font-size: 10pt;
-            font-weight: bold;
-        }}
-        .totals-table {{
-            width: 280px;
-        }}
-        .totals-table tr td {{
-            padding: 6px 12px;
-            font-size: 10pt;
-        }}
-        .totals-table tr td:first-child {{
-            font-weight: bold;
-            text-align: right;
-            text-transform: uppercase;
-        }}
-        .totals-table tr td:last-child {{
-            text-align: right;
-        }}
-        .totals-table .subtotal-row {{
-            border-top: 1px solid #e0e0e0;
-        }}
-        .totals-table .tax-row {{
-            color: #666;
-            font-size: 9pt;
-        }}
-        .totals-table .total-row {{
-            background: #4472C4;
-            color: white;
-            font-weight: bold;
-            font-size: 12pt;
-        }}
-        .totals-table .total-row td {{
-            padding: 10px 12px;
-        }}
-        
-        /* Bank Details */
-        .bank-details {{
-            background: #fafafa;
-            padding: 12px;
-            margin-top: 15px;
-            border-radius: 4px;
-            border: 1px solid #e0e0e0;
-        }}
-        .bank-details h4 {{
-            font-size: 10pt;
-            font-weight: bold;
-            margin-bottom: 6px;
-            color: #4472C4;
-        }}
-        .bank-details p {{
-            font-size: 9pt;
-            line-height: 1.4;
-            margin: 2px 0;
-        }}
-        .bank-label {{
-            display: inline-block;
-            width: 110px;
-            font-weight: bold;
-        }}
-        
-        /* Footer */
-        .footer {{
-            margin-top: 15px;
-            padding-top: 12px;
-            border-top: 1px solid #e0e0e0;
-            text-align: center;
-            font-size: 8pt;
-            color: #666;
-        }}
-        .footer p {{
-            margin: 3px 0;
-        }}
-        
-        /* Print Styles */
-        @media print {{
-            body {{
-                background: white;
-                padding: 0;
-            }}
-            .page-wrapper {{
-                box-shadow: none;
-                max-width: 100%;
-            }}
-            .action-bar {{
-                display: none;
-            }}
-            .invoice-container {{
-                padding: 0;
-            }}
-        }}
-    </style>
-</head>
-<body>
-    <div class="page-wrapper">
-        <div class="action-bar">
-            <h2>📄 Invoice Preview</h2>
-            <button class="action-btn" onclick="window.print()">
-                🖨️ Print / Download PDF
-            </button>
-        </div>
-        
-        <div class="invoice-container">
-            <!-- Header -->
-            <div class="header">
-                <div class="company-info">
-                    <div class="company-name">Khalsa Sacffolding LTD</div>
-                    <div class="company-details">
-                        66 Raynton Drive<br>
-                        Hayes UB4 8BE<br>
-                        Phone: 07741252013
-                    </div>
-                </div>
-                <div class="invoice-title">
-                    <h1>INVOICE</h1>
-                </div>
-            </div>
-            
-            <!-- Invoice Meta Info -->
-            <div class="invoice-meta">
-                <div class="meta-section">
-                    <h3>Bill To</h3>
-                    <p><strong>{invoice['clientName']}</strong></p>
-                    <p>{invoice.get('clientPhone', '')}</p>
-                    <p>{invoice.get('clientAddress', '')}</p>
-                </div>
-                <div class="meta-section">
-                    <h3>Invoice Details</h3>
-                    <p><span class="meta-label">Invoice #:</span> {invoice['invoiceNumber']}</p>
-                    <p><span class="meta-label">Date:</span> {invoice_date}</p>
-                </div>
-            </div>
-            
-            <!-- Items Table -->
-            <table class="items-table">
-                <thead>
-                    <tr>
-                        <th style="width: 40px;">#</th>
-                        <th>Description</th>
-                        <th style="width: 60px; text-align: center;">Qty</th>
-                        <th style="width: 100px; text-align: right;">Unit Price</th>
-                        <th style="width: 100px; text-align: right;">Amount</th>
-                    </tr>
-                </thead>
-                <tbody>
-                    {items_html}
-                </tbody>
-            </table>
-            
-            <!-- Totals -->
-            <div class="totals-section">
-                <div class="thank-you">
-                    Thank you for your business!
-                </div>
-                <table class="totals-table">
-                    <tr class="subtotal-row">
-                        <td>Subtotal:</td>
-                        <td>£{invoice['subtotal']:,.0f}</td>
-                    </tr>'''
-        
-        if invoice.get('vatApplied', True):
-            html += f'''
-                    <tr class="tax-row">
-                        <td>Tax Rate:</td>
-                        <td>20%</td>
-                    </tr>
-                    <tr class="tax-row">
-                        <td>VAT:</td>
-                        <td>£{invoice['vat']:,.0f}</td>
-                    </tr>'''
-        
-        html += f'''
-                    <tr class="total-row">
-                        <td>Total:</td>
-                        <td>£{invoice['total']:,.0f}</td>
-                    </tr>
-                </table>
-            </div>
-            
-            <!-- Bank Details -->
-            <div class="bank-details">
-                <h4>Payment Information</h4>
-                <p><span class="bank-label">Bank name:</span> Khalsa Scaffolding LTD</p>
-                <p><span class="bank-label">Account number:</span> 33189759</p>
-                <p><span class="bank-label">Sort code:</span> 20-42-76</p>
-            </div>
-            
-            <!-- Footer -->
-            <div class="footer">
-                <p><strong>If you have any questions about this invoice, please contact:</strong></p>
-                <p>Jagtar Singh Brar, 07741252013</p>
-                <p>Company number: 13490441 | VAT: 43747190</p>
-            </div>
-        </div>
-    </div>
-</body>
-</html>
-'''
-        
-        from flask import make_response
-        response = make_response(html)
-        response.headers['Content-Type'] = 'text/html'
+        etag = f"{invoice_digest(invoice)}-{PREVIEW_CSS_VERSION}"
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            response = Response(cached_preview(invoice, etag), mimetype='text/html')
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
+        return response
+    except Exception as e:
+        return jsonify({'error': f'Error generating preview: {str(e)}'}), 500
+
+@app.route('/api/invoices/preview-batch', methods=['GET'])
+def preview_invoice_batch():
+    """Render many invoices into one print document, one invoice per page
+
+    Invoices are picked by ids=1,2,3 or a date range (see invoice_batch_from_args)
+    and fetched with a single query.
+    """
+    try:
+        invoices = invoice_batch_from_args(get_db(), request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not invoices:
+        return jsonify({'error': 'No invoices to preview'}), 404
+    
+    try:
+        digests = ','.join(invoice_digest(invoice) for invoice in invoices)
+        etag = f"{hashlib.sha1(digests.encode('ascii')).hexdigest()[:16]}-{PREVIEW_CSS_VERSION}"
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            with ThreadPoolExecutor(max_workers=EXPORT_WORKERS) as executor:
+                pages = list(executor.map(invoice_context, invoices))
+            html = render_template('invoice_batch_preview.html', pages=pages,
+                                   css_version=PREVIEW_CSS_VERSION)
+            response = Response(html, mimetype='text/html')
+        response.set_etag(etag)
+        response.cache_control.no_cache = True
         return response
     except Exception as e:
         return jsonify({'error': f'Error generating preview: {str(e)}'}), 500
 
+# ============================================================================
+# INVOICE EXCEL EXPORT
+# ============================================================================
+
+# Style objects are immutable once built, so one set is shared by every sheet
+XL_HEADER_FONT = Font(name='Calibri', size=14, bold=True, color='000000')
+XL_TITLE_FONT = Font(name='Calibri', size=18, bold=True, color='000000')
+XL_SECTION_FONT = Font(name='Calibri', size=11, bold=True, color='000000')
+XL_NORMAL_FONT = Font(name='Calibri', size=11, color='000000')
+XL_SMALL_FONT = Font(name='Calibri', size=9, color='000000')
+XL_TABLE_HEADER_FONT = Font(name='Calibri', size=11, bold=True, color='FFFFFF')
+XL_TABLE_HEADER_FILL = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
+XL_BORDER_THIN = Border(
+    left=Side(style='thin'),
+    right=Side(style='thin'),
+    top=Side(style='thin'),
+    bottom=Side(style='thin')
+)
+XL_ALIGN_TITLE = Alignment(horizontal='right', vertical='top')
+XL_ALIGN_HEADER_LEFT = Alignment(horizontal='left', vertical='center')
+XL_ALIGN_HEADER_CENTER = Alignment(horizontal='center', vertical='center')
+XL_ALIGN_CENTER = Alignment(horizontal='center')
+XL_COLUMN_WIDTHS = {'A': 15, 'B': 15, 'C': 30, 'D': 12, 'E': 12, 'F': 15, 'G': 15, 'H': 15}
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+INVOICE_BATCH_LIMIT = 500  # invoices per batch request; keeps IN (...) lists well inside SQLite limits
+EXPORT_WORKERS = min(4, os.cpu_count() or 1)
+
+def write_invoice_sheet(ws, invoice, items):
+    """Lay out one invoice on a worksheet, matching the template design"""
+    for column, width in XL_COLUMN_WIDTHS.items():
+        ws.column_dimensions[column].width = width
+    
+    # Row 1: Company Name and Invoice Title
+    ws['A1'] = 'Khalsa Sacffolding LTD'
+    ws['A1'].font = XL_HEADER_FONT
+    ws['G1'] = 'INVOICE'
+    ws['G1'].font = XL_TITLE_FONT
+    ws['G1'].alignment = XL_ALIGN_TITLE
+    
+    # Row 2-3: Company Address
+    ws['A2'] = '66 Raynton Drive'
+    ws['A2'].font = XL_NORMAL_FONT
+    ws['A3'] = 'Hayes UB4 8BE'
+    ws['A3'].font = XL_NORMAL_FONT
+    
+    # Row 4-5: Phone and Invoice Details
+    ws['A4'] = 'Phone: 07741252013'
+    ws['A4'].font = XL_NORMAL_FONT
+    ws['F4'] = 'INVOICE #'
+    ws['F4'].font = XL_SECTION_FONT
+    ws['H4'] = 'DATE'
+    ws['H4'].font = XL_SECTION_FONT
+    
+    ws['F5'] = invoice['invoiceNumber']
+    ws['F5'].font = XL_NORMAL_FONT
+    ws['H5'] = datetime.strptime(invoice['date'], '%Y-%m-%d').strftime('%Y-%m-%d')
+    ws['H5'].font = XL_NORMAL_FONT
+    
+    # Row 7-10: Bill To Section
+    ws['A7'] = 'BILL TO'
+    ws['A7'].font = XL_SECTION_FONT
+    ws['F7'] = 'CUSTOMER ID'
+    ws['F7'].font = XL_SECTION_FONT
+    ws['H7'] = 'TERMS'
+    ws['H7'].font = XL_SECTION_FONT
+    
+    ws['A8'] = invoice['clientName']
+    ws['A8'].font = XL_NORMAL_FONT
+    ws['H8'] = 'Due Upon Receipt'
+    ws['H8'].font = XL_NORMAL_FONT
+    
+    # Client contact person (if available in clientPhone field, we'll put it here)
+    if invoice.get('clientPhone'):
+        ws['A9'] = invoice['clientPhone']
+        ws['A9'].font = XL_NORMAL_FONT
+    
+    # Client address
+    if invoice.get('clientAddress'):
+        ws['A10'] = invoice['clientAddress']
+        ws['A10'].font = XL_NORMAL_FONT
+    
+    # Row 15: Table Headers
+    current_row = 15
+    ws[f'A{current_row}'] = 'DESCRIPTION'
+    ws[f'F{current_row}'] = 'QTY'
+    ws[f'G{current_row}'] = 'UNIT PRICE'
+    ws[f'H{current_row}'] = 'AMOUNT'
+    
+    for col in ['A', 'F', 'G', 'H']:
+        cell = ws[f'{col}{current_row}']
+        cell.font = XL_TABLE_HEADER_FONT
+        cell.fill = XL_TABLE_HEADER_FILL
+        cell.alignment = XL_ALIGN_HEADER_CENTER if col != 'A' else XL_ALIGN_HEADER_LEFT
+        cell.border = XL_BORDER_THIN
+    
+    # Add invoice items
+    current_row = 16
+    item_start_row = current_row
+    for idx, item in enumerate(items, 1):
+        ws[f'A{current_row}'] = idx
+        ws[f'C{current_row}'] = item['description']
+        ws[f'F{current_row}'] = item.get('quantity', 1)
+        ws[f'G{current_row}'] = item.get('rate', 0)
+        
+        # Calculate amount
+        amount = item.get('quantity', 1) * item.get('rate', 0)
+        ws[f'H{current_row}'] = amount
+        
+        # Format cells
+        ws[f'A{current_row}'].font = XL_NORMAL_FONT
+        ws[f'C{current_row}'].font = XL_NORMAL_FONT
+        ws[f'F{current_row}'].font = XL_NORMAL_FONT
+        ws[f'F{current_row}'].alignment = XL_ALIGN_CENTER
+        ws[f'G{current_row}'].font = XL_NORMAL_FONT
+        ws[f'G{current_row}'].number_format = '#,##0'
+        ws[f'H{current_row}'].font = XL_NORMAL_FONT
+        ws[f'H{current_row}'].number_format = '#,##0'
+        
+        current_row += 1
+    
+    item_end_row = current_row - 1
+    
+    # Add thank you message and totals section
+    current_row = 23
+    ws[f'A{current_row}'] = 'Thank you for your business!'
+    ws[f'A{current_row}'].font = XL_NORMAL_FONT
+    
+    ws[f'F{current_row}'] = 'SUBTOTAL'
+    ws[f'F{current_row}'].font = XL_SECTION_FONT
+    ws[f'H{current_row}'] = f'=SUM(H{item_start_row}:H{item_end_row})'
+    ws[f'H{current_row}'].number_format = '#,##0'
+    
+    current_row = 24
+    ws[f'F{current_row}'] = 'TAX RATE'
+    ws[f'F{current_row}'].font = XL_SECTION_FONT
+    tax_rate = 0.2 if invoice.get('vatApplied', True) else 0
+    ws[f'H{current_row}'] = tax_rate
+    ws[f'H{current_row}'].number_format = '0.0'
+    
+    current_row = 25
+    ws[f'B{current_row}'] = 'Bank name: Khalsa Scaffolding LTD'
+    ws[f'B{current_row}'].font = XL_NORMAL_FONT
+    ws[f'F{current_row}'] = 'VAT'
+    ws[f'F{current_row}'].font = XL_SECTION_FONT
+    ws[f'H{current_row}'] = '=H23*H24'
+    ws[f'H{current_row}'].number_format = '#,##0'
+    
+    current_row = 26
+    ws[f'B{current_row}'] = 'Account number: 33189759'
+    ws[f'B{current_row}'].font = XL_NORMAL_FONT
+    ws[f'F{current_row}'] = 'TOTAL'
+    ws[f'F{current_row}'].font = XL_SECTION_FONT
+    ws[f'H{current_row}'] = '=H23+H25'
+    ws[f'H{current_row}'].font = XL_SECTION_FONT
+    ws[f'H{current_row}'].number_format = '#,##0'
+    
+    current_row = 27
+    ws[f'B{current_row}'] = 'Sort code: 20-42-76'
+    ws[f'B{current_row}'].font = XL_NORMAL_FONT
+    
+    current_row = 29
+    ws[f'C{current_row}'] = '                         company number: 13490441 VAT:43747190'
+    ws[f'C{current_row}'].font = XL_SMALL_FONT
+    
+    current_row = 30
+    ws[f'A{current_row}'] = 'If you have any questions about this invoice, please contact'
+    ws[f'A{current_row}'].font = XL_SMALL_FONT
+    
+    current_row = 31
+    ws[f'A{current_row}'] = 'Jagtar Singh Brar, 07741252013'
+    ws[f'A{current_row}'].font = XL_SMALL_FONT
+
+def sheet_title(invoice, used):
+    """Unique worksheet title for an invoice (Excel allows 31 chars, no []:*?/\\)"""
+    base = f"Invoice {invoice['invoiceNumber']}"
+    base = ''.join('_' if ch in '[]:*?/\\' else ch for ch in base)[:31]
+    title, n = base, 2
+    while title.lower() in used:
+        suffix = f' ({n})'
+        title, n = base[:31 - len(suffix)] + suffix, n + 1
+    used.add(title.lower())
+    return title
+
+def invoice_workbook_bytes(invoice):
+    """Single-invoice .xlsx file as bytes"""
+    wb = Workbook()
+    ws = wb.active
+    ws.title = sheet_title(invoice, set())
+    write_invoice_sheet(ws, invoice, json.loads(invoice['items'] or '[]'))
+    output = BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+def invoice_batch_from_args(conn, args):
+    """Invoices selected by ids=1,2,3 or the standard date range arguments, oldest first
+
+    Raises ValueError on malformed or missing selection arguments.
+    """
+    ids = args.get('ids')
+    if ids:
+        try:
+            id_list = list(dict.fromkeys(int(i) for i in ids.split(',') if i.strip()))
+        except ValueError:
+            raise ValueError('ids must be a comma separated list of numbers')
+        if len(id_list) > INVOICE_BATCH_LIMIT:
+            raise ValueError(f'At most {INVOICE_BATCH_LIMIT} invoices per batch')
+        placeholders = ','.join('?' * len(id_list))
+        rows = conn.execute(f'SELECT * FROM invoices WHERE id IN ({placeholders})', id_list).fetchall()
+        by_id = {row['id']: dict(row) for row in rows}
+        return [by_id[i] for i in id_list if i in by_id]
+    
+    date_range = date_range_from_args(args)
+    if date_range is None:
+        raise ValueError('Provide ids or a date range (month, year, quarter, start_date/end_date)')
+    where, params = date_range_filter('date', date_range)
+    rows = conn.execute(f'SELECT * FROM invoices WHERE 1=1 {where} ORDER BY date, id LIMIT ?',
+                        params + [INVOICE_BATCH_LIMIT + 1]).fetchall()
+    if len(rows) > INVOICE_BATCH_LIMIT:
+        raise ValueError(f'At most {INVOICE_BATCH_LIMIT} invoices per batch; narrow the date range')
+    return [dict(row) for row in rows]
+
+def invoice_batch_workbook_bytes(invoices):
+    """One .xlsx with a sheet per invoice, as bytes"""
+    # openpyxl workbooks are not thread-safe: items are parsed in the pool, sheets built in order
+    with ThreadPoolExecutor(max_workers=EXPORT_WORKERS) as executor:
+        parsed_items = list(executor.map(lambda inv: json.loads(inv['items'] or '[]'), invoices))
+    
+    wb = Workbook()
+    wb.remove(wb.active)
+    used = set()
+    for invoice, items in zip(invoices, parsed_items):
+        write_invoice_sheet(wb.create_sheet(sheet_title(invoice, used)), invoice, items)
+    
+    output = BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+class _ByteSink:
+    """Unseekable write target that collects bytes until drained"""
+    def __init__(self):
+        self._chunks = []
+    
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def stream_invoice_zip(invoices):
+    """Yield a ZIP of one .xlsx per invoice, each entry sent as soon as its workbook is built"""
+    names, used = {}, set()
+    for invoice in invoices:
+        base = secure_filename(f"Invoice_{invoice['invoiceNumber']}") or f"Invoice_{invoice['id']}"
+        name, n = f'{base}.xlsx', 2
+        while name.lower() in used:
+            name, n = f'{base}_{n}.xlsx', n + 1
+        used.add(name.lower())
+        names[invoice['id']] = name
+    
+    sink = _ByteSink()
+    executor = ThreadPoolExecutor(max_workers=EXPORT_WORKERS)
+    try:
+        futures = {executor.submit(invoice_workbook_bytes, invoice): invoice for invoice in invoices}
+        with zipfile.ZipFile(sink, 'w', zipfile.ZIP_STORED) as archive:
+            for future in as_completed(futures):
+                invoice = futures[future]
+                archive.writestr(names[invoice['id']], future.result())  # xlsx is already compressed
+                yield sink.drain()
+        yield sink.drain()
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
 @app.route('/api/invoices/<int:invoice_id>/excel', methods=['GET'])
 def download_invoice_excel(invoice_id):
     """Generate Excel invoice matching the template design"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row
+        conn = get_db()
         cursor = conn.cursor()
         cursor.execute('SELECT * FROM invoices WHERE id=?', (invoice_id,))
         invoice_row = cursor.fetchone()
-        conn.close()
         
         if not invoice_row:
             return jsonify({'error': 'Invoice not found'}), 404
         
         invoice = dict(invoice_row)
-        items = json.loads(invoice['items'])
-        
-        # Create a new workbook
-        wb = Workbook()
-        ws = wb.active
-        ws.title = f"Invoice {invoice['invoiceNumber']}"
-        
-        # Define styles
-        header_font = Font(name='Calibri', size=14, bold=True, color='000000')
-        invoice_title_font = Font(name='Calibri', size=18, bold=True, color='000000')
-        section_header_font = Font(name='Calibri', size=11, bold=True, color='000000')
-        normal_font = Font(name='Calibri', size=11, color='000000')
-        small_font = Font(name='Calibri', size=9, color='000000')
-        
-        table_header_font = Font(name='Calibri', size=11, bold=True, color='FFFFFF')
-        table_header_fill = PatternFill(start_color='4472C4', end_color='4472C4', fill_type='solid')
-        
-        border_thin = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
-        
-        # Set column widths
-        ws.column_dimensions['A'].width = 15
-        ws.column_dimensions['B'].width = 15
-        ws.column_dimensions['C'].width = 30
-        ws.column_dimensions['D'].width = 12
-        ws.column_dimensions['E'].width = 12
-        ws.column_dimensions['F'].width = 15
-        ws.column_dimensions['G'].width = 15
-        ws.column_dimensions['H'].width = 15
-        
-        # Row 1: Company Name and Invoice Title
-        ws['A1'] = 'Khalsa Sacffolding LTD'
-        ws['A1'].font = header_font
-        ws['G1'] = 'INVOICE'
-        ws['G1'].font = invoice_title_font
-        ws['G1'].alignment = Alignment(horizontal='right', vertical='top')
-        
-        # Row 2-3: Company Address
-        ws['A2'] = '66 Raynton Drive'
-        ws['A2'].font = normal_font
-        ws['A3'] = 'Hayes UB4 8BE'
-        ws['A3'].font = normal_font
-        
-        # Row 4-5: Phone and Invoice Details
-        ws['A4'] = 'Phone: 07741252013'
-        ws['A4'].font = normal_font
-        ws['F4'] = 'INVOICE #'
-        ws['F4'].font = section_header_font
-        ws['H4'] = 'DATE'
-        ws['H4'].font = section_header_font
-        
-        ws['F5'] = invoice['invoiceNumber']
-        ws['F5'].font = normal_font
-        ws['H5'] = datetime.strptime(invoice['date'], '%Y-%m-%d').strftime('%Y-%m-%d')
-        ws['H5'].font = normal_font
-        
-        # Row 7-10: Bill To Section
-        ws['A7'] = 'BILL TO'
-        ws['A7'].font = section_header_font
-        ws['F7'] = 'CUSTOMER ID'
-        ws['F7'].font = section_header_font
-        ws['H7'] = 'TERMS'
-        ws['H7'].font = section_header_font
-        
-        ws['A8'] = invoice['clientName']
-        ws['A8'].font = normal_font
-        ws['H8'] = 'Due Upon Receipt'
-        ws['H8'].font = normal_font
-        
-        # Client contact person (if available in clientPhone field, we'll put it here)
-        if invoice.get('clientPhone'):
-            ws['A9'] = invoice['clientPhone']
-            ws['A9'].font = normal_font
-        
-        # Client address
-        if invoice.get('clientAddress'):
-            ws['A10'] = invoice['clientAddress']
-            ws['A10'].font = normal_font
-        
-        # Row 15: Table Headers
-        current_row = 15
-        ws[f'A{current_row}'] = 'DESCRIPTION'
-        ws[f'F{current_row}'] = 'QTY'
-        ws[f'G{current_row}'] = 'UNIT PRICE'
-        ws[f'H{current_row}'] = 'AMOUNT'
-        
-        for col in ['A', 'F', 'G', 'H']:
-            cell = ws[f'{col}{current_row}']
-            cell.font = table_header_font
-            cell.fill = table_header_fill
-            cell.alignment = Alignment(horizontal='center' if col != 'A' else 'left', vertical='center')
-            cell.border = border_thin
-        
-        # Add invoice items
-        current_row = 16
-        item_start_row = current_row
-        for idx, item in enumerate(items, 1):
-            ws[f'A{current_row}'] = idx
-            ws[f'C{current_row}'] = item['description']
-            ws[f'F{current_row}'] = item.get('quantity', 1)
-            ws[f'G{current_row}'] = item.get('rate', 0)
-            
-            # Calculate amount
-            amount = item.get('quantity', 1) * item.get('rate', 0)
-            ws[f'H{current_row}'] = amount
-            
-            # Format cells
-            ws[f'A{current_row}'].font = normal_font
-            ws[f'C{current_row}'].font = normal_font
-            ws[f'F{current_row}'].font = normal_font
-            ws[f'F{current_row}'].alignment = Alignment(horizontal='center')
-            ws[f'G{current_row}'].font = normal_font
-            ws[f'G{current_row}'].number_format = '#,##0'
-            ws[f'H{current_row}'].font = normal_font
-            ws[f'H{current_row}'].number_format = '#,##0'
-            
-            current_row += 1
-        
-        item_end_row = current_row - 1
-        
-        # Add thank you message and totals section
-        current_row = 23
-        ws[f'A{current_row}'] = 'Thank you for your business!'
-        ws[f'A{current_row}'].font = normal_font
-        
-        ws[f'F{current_row}'] = 'SUBTOTAL'
-        ws[f'F{current_row}'].font = section_header_font
-        ws[f'H{current_row}'] = f'=SUM(H{item_start_row}:H{item_end_row})'
-        ws[f'H{current_row}'].number_format = '#,##0'
-        
-        current_row = 24
-        ws[f'F{current_row}'] = 'TAX RATE'
-        ws[f'F{current_row}'].font = section_header_font
-        tax_rate = 0.2 if invoice.get('vatApplied', True) else 0
-        ws[f'H{current_row}'] = tax_rate
-        ws[f'H{current_row}'].number_format = '0.0'
-        
-        current_row = 25
-        ws[f'B{current_row}'] = 'Bank name: Khalsa Scaffolding LTD'
-        ws[f'B{current_row}'].font = normal_font
-        ws[f'F{current_row}'] = 'VAT'
-        ws[f'F{current_row}'].font = section_header_font
-        ws[f'H{current_row}'] = '=H23*H24'
-        ws[f'H{current_row}'].number_format = '#,##0'
-        
-        current_row = 26
-        ws[f'B{current_row}'] = 'Account number: 33189759'
-        ws[f'B{current_row}'].font = normal_font
-        ws[f'F{current_row}'] = 'TOTAL'
-        ws[f'F{current_row}'].font = Font(name='Calibri', size=11, bold=True, color='000000')
-        ws[f'H{current_row}'] = '=H23+H25'
-        ws[f'H{current_row}'].font = Font(name='Calibri', size=11, bold=True, color='000000')
-        ws[f'H{current_row}'].number_format = '#,##0'
-        
-        current_row = 27
-        ws[f'B{current_row}'] = 'Sort code: 20-42-76'
-        ws[f'B{current_row}'].font = normal_font
-        
-        current_row = 29
-        ws[f'C{current_row}'] = '                         company number: 13490441 VAT:43747190'
-        ws[f'C{current_row}'].font = small_font
-        
-        current_row = 30
-        ws[f'A{current_row}'] = 'If you have any questions about this invoice, please contact'
-        ws[f'A{current_row}'].font = small_font
-        
-        current_row = 31
-        ws[f'A{current_row}'] = 'Jagtar Singh Brar, 07741252013'
-        ws[f'A{current_row}'].font = small_font
-        
-        # Save to BytesIO
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-        
-        from flask import send_file
         return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            BytesIO(invoice_workbook_bytes(invoice)),
+            mimetype=XLSX_MIMETYPE,
             as_attachment=True,
             download_name=f'Invoice_{invoice["invoiceNumber"]}.xlsx'
         )
@@ -1151,43 +2124,59 @@ def download_invoice_excel(invoice_id):
     except Exception as e:
         return jsonify({'error': f'Error generating Excel invoice: {str(e)}'}), 500
 
-        
+@app.route('/api/invoices/export-batch', methods=['GET'])
+def export_invoice_batch():
+    """Export many invoices at once: one workbook with a sheet each (format=xlsx) or a ZIP (format=zip)"""
+    export_format = request.args.get('format', 'xlsx')
+    if export_format not in ('xlsx', 'zip'):
+        return jsonify({'error': 'format must be xlsx or zip'}), 400
+    
+    try:
+        invoices = invoice_batch_from_args(get_db(), request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not invoices:
+        return jsonify({'error': 'No invoices to export'}), 404
+    
+    stamp = datetime.now().strftime('%Y%m%d')
+    if export_format == 'zip':
+        response = Response(stream_invoice_zip(invoices), mimetype='application/zip')
+        response.headers['Content-Disposition'] = f'attachment; filename=invoices_{stamp}.zip'
+        return response
+    
+    try:
+        return send_file(BytesIO(invoice_batch_workbook_bytes(invoices)), mimetype=XLSX_MIMETYPE,
+                         as_attachment=True, download_name=f'invoices_{stamp}.xlsx')
     except Exception as e:
-        return jsonify({'error': f'Error generating invoice preview: {str(e)}'}), 500
+        return jsonify({'error': f'Error generating Excel invoices: {str(e)}'}), 500
 
 # API Routes - Inquiries
 @app.route('/api/inquiries', methods=['GET'])
+@conditional_on('inquiries')
 def get_inquiries():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM inquiries ORDER BY date DESC')
-    inquiries = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return jsonify(inquiries)
+    return list_rows(get_db(), 'inquiries', 'date')
 
 @app.route('/api/inquiries', methods=['POST'])
 def create_inquiry():
     data = request.json
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute('''
         INSERT INTO inquiries (name, phone, email, location, status, date, quoteAmount, notes, linkedJobId)
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
     ''', (
         data['name'], data['phone'], data.get('email'), data['location'],
-        data.get('status', 'new'), data['date'], data.get('quoteAmount'),
+        data.get('status', 'new'), normalize_date(data['date']), data.get('quoteAmount'),
         data.get('notes'), data.get('linkedJobId')
     ))
     conn.commit()
     inquiry_id = cursor.lastrowid
-    conn.close()
     return jsonify({'id': inquiry_id, 'message': 'Inquiry created successfully'}), 201
 
 @app.route('/api/inquiries/<int:inquiry_id>', methods=['PUT'])
 def update_inquiry(inquiry_id):
     data = request.json
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute('''
         UPDATE inquiries 
@@ -1195,37 +2184,51 @@ def update_inquiry(inquiry_id):
         WHERE id=?
     ''', (
         data['name'], data['phone'], data.get('email'), data['location'],
-        data['status'], data['date'], data.get('quoteAmount'), data.get('notes'),
+        data['status'], normalize_date(data['date']), data.get('quoteAmount'), data.get('notes'),
         data.get('linkedJobId'), inquiry_id
     ))
     conn.commit()
-    conn.close()
     return jsonify({'message': 'Inquiry updated successfully'})
 
+@app.route('/api/inquiries/<int:inquiry_id>', methods=['PATCH'])
+def patch_inquiry(inquiry_id):
+    return patch_row('inquiries', inquiry_id, request.json)
+
 @app.route('/api/inquiries/<int:inquiry_id>', methods=['DELETE'])
 def delete_inquiry(inquiry_id):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute('DELETE FROM inquiries WHERE id=?', (inquiry_id,))
     conn.commit()
-    conn.close()
     return jsonify({'message': 'Inquiry deleted successfully'})
 
 # API Routes - Jobs
 @app.route('/api/jobs', methods=['GET'])
+@conditional_on('jobs')
 def get_jobs():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
-    cursor.execute('SELECT * FROM jobs ORDER BY createdAt DESC')
-    jobs = [dict(row) for row in cursor.fetchall()]
-    conn.close()
-    return jsonify(jobs)
+    return list_rows(get_db(), 'jobs', 'createdAt')
+
+def job_area(data):
+    """Area chosen for a job, or the one its location's postcode belongs to"""
+    area = data.get('area')
+    if area and area != postcodes.UNASSIGNED:
+        return area
+    return postcodes.area_for_address(data.get('location'))[1]
+
+@app.route('/api/postcodes/area', methods=['GET'])
+def lookup_postcode_area():
+    """Postcode and branch area for ?address= (a full address or just a postcode)"""
+    address = request.args.get('address', '')
+    if not address.strip():
+        return jsonify({'error': 'address is required'}), 400
+    postcode, area = postcodes.area_for_address(address)
+    return jsonify({'postcode': postcode, 'area': area})
 
 @app.route('/api/jobs', methods=['POST'])
 def create_job():
+    """Create a job; without an area (or with Unassigned) it is taken from the location's postcode"""
     data = request.json
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
     try:
         cursor.execute('''
@@ -1233,26 +2236,24 @@ def create_job():
                             endDate, status, value, linkedInvoiceId, linkedInquiryId, notes)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
-            data['jobNumber'], data['clientName'], data['location'], data.get('area'),
-            data.get('jobType'), data.get('truck'), data.get('driver'), data.get('startDate'), data.get('endDate'),
+            data['jobNumber'], data['clientName'], data['location'], job_area(data),
+            data.get('jobType'), data.get('truck'), data.get('driver'),
+            normalize_date(data.get('startDate')), normalize_date(data.get('endDate')),
             data.get('status', 'pending'), data.get('value'), data.get('linkedInvoiceId'),
             data.get('linkedInquiryId'), data.get('notes')
         ))
         conn.commit()
         job_id = cursor.lastrowid
-        conn.close()
         return jsonify({'id': job_id, 'message': 'Job created successfully'}), 201
     except sqlite3.IntegrityError:
-        conn.close()
         return jsonify({'error': 'Job number already exists'}), 400
     except Exception as e:
-        conn.close()
         return jsonify({'error': f'Error creating job: {str(e)}'}), 400
 
 @app.route('/api/jobs/<int:job_id>', methods=['PUT'])
 def update_job(job_id):
     data = request.json
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
     try:
         cursor.execute('''
@@ -1263,89 +2264,180 @@ def update_job(job_id):
             WHERE id=?
         ''', (
             data['jobNumber'], data['clientName'], data['location'], data.get('area'),
-            data.get('jobType'), data.get('truck'), data.get('driver'), data.get('startDate'), data.get('endDate'),
+            data.get('jobType'), data.get('truck'), data.get('driver'),
+            normalize_date(data.get('startDate')), normalize_date(data.get('endDate')),
             data.get('status'), data.get('value'), data.get('linkedInvoiceId'),
             data.get('linkedInquiryId'), data.get('notes'), job_id
         ))
         conn.commit()
-        conn.close()
         return jsonify({'message': 'Job updated successfully'})
     except Exception as e:
-        conn.close()
         return jsonify({'error': f'Error updating job: {str(e)}'}), 400
 
+@app.route('/api/jobs/<int:job_id>', methods=['PATCH'])
+def patch_job(job_id):
+    return patch_row('jobs', job_id, request.json)
+
 @app.route('/api/jobs/<int:job_id>', methods=['DELETE'])
 def delete_job(job_id):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute('DELETE FROM jobs WHERE id=?', (job_id,))
     conn.commit()
-    conn.close()
     return jsonify({'message': 'Job deleted successfully'})
 
+def require_id_list(ids):
+    """ids as given if it is a list of integer row ids; raises ValueError otherwise"""
+    if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        raise ValueError('ids must be a list of integer ids')
+    return ids
+
 @app.route('/api/jobs/bulk-delete', methods=['POST'])
 def bulk_delete_jobs():
-    data = request.json
-    ids = data.get('ids', [])
+    data = request.json or {}
+    ids = data.get('ids') or []
     if not ids:
         return jsonify({'error': 'No IDs provided'}), 400
+    try:
+        require_id_list(ids)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
     placeholders = ','.join('?' * len(ids))
     cursor.execute(f'DELETE FROM jobs WHERE id IN ({placeholders})', ids)
     conn.commit()
-    conn.close()
     return jsonify({'message': f'{len(ids)} jobs deleted successfully'})
 
-@app.route('/api/jobs/export', methods=['GET'])
-def export_jobs():
-    import csv
-    from io import StringIO
+# Columns a bulk update may set, and columns it may select jobs by
+BULK_UPDATE_JOB_FIELDS = [
+    'clientName', 'location', 'area', 'jobType', 'truck', 'driver', 'startDate', 'endDate',
+    'status', 'value', 'linkedInvoiceId', 'linkedInquiryId', 'notes'
+]
+BULK_FILTER_JOB_FIELDS = ['area', 'status', 'truck', 'driver']
+
+def apply_job_bulk_update(conn, data):
+    """Run one set-based UPDATE on jobs and return the number of rows changed
+
+    data is {"ids": [...]} or {"filter": {...}} plus {"changes": {...}}; raises
+    ValueError on invalid input and sqlite3.Error if the update fails.
+    """
+    ids = require_id_list(data.get('ids') or [])
+    filters = data.get('filter') or {}
+    changes = data.get('changes') or {}
+    if not isinstance(filters, dict) or not isinstance(changes, dict):
+        raise ValueError('filter and changes must be objects')
+    nested = [f for f, value in list(changes.items()) + list(filters.items()) if isinstance(value, (dict, list))]
+    if nested:
+        raise ValueError(f'Fields must be plain values: {", ".join(nested)}')
     
-    area = request.args.get('area', 'all')
+    if not changes:
+        raise ValueError('No changes provided')
+    if not ids and not filters:
+        raise ValueError('Provide ids or a filter')
     
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    cursor = conn.cursor()
+    unknown = [f for f in changes if f not in BULK_UPDATE_JOB_FIELDS]
+    unknown += [f for f in filters if f not in BULK_FILTER_JOB_FIELDS]
+    if unknown:
+        raise ValueError(f'Unsupported fields: {", ".join(unknown)}')
     
-    if area == 'all':
-        cursor.execute('SELECT * FROM jobs ORDER BY createdAt DESC')
-    else:
-        cursor.execute('SELECT * FROM jobs WHERE area = ? ORDER BY createdAt DESC', (area,))
+    set_clause = ', '.join(f'{field}=?' for field in changes)
+    set_params = [normalize_date(value) if field in DATE_COLUMNS['jobs'] else value
+                  for field, value in changes.items()]
     
-    jobs = [dict(row) for row in cursor.fetchall()]
-    conn.close()
+    where = ''
+    where_params = []
+    if ids:
+        where += f' AND id IN ({",".join("?" * len(ids))})'
+        where_params.extend(ids)
+    for field, value in filters.items():
+        if value is None:
+            where += f' AND {field} IS NULL'
+        else:
+            where += f' AND {field} = ?'
+            where_params.append(value)
     
-    if not jobs:
-        return jsonify({'error': 'No jobs to export'}), 404
+    try:
+        cursor = conn.execute(f'''
+            UPDATE jobs SET {set_clause}, updatedAt=CURRENT_TIMESTAMP
+            WHERE 1=1 {where}
+        ''', set_params + where_params)
+        conn.commit()
+    except sqlite3.Error:
+        conn.rollback()
+        raise
+    return cursor.rowcount
+
+@app.route('/api/jobs/bulk-update', methods=['POST'])
+def bulk_update_jobs():
+    """Apply the same field changes to many jobs in one UPDATE
+
+    Body: {"ids": [...]} or {"filter": {"area": ..., "status": ..., "truck": ...}}
+    plus {"changes": {field: value, ...}}. Returns the number of rows updated.
+    """
+    try:
+        updated = apply_job_bulk_update(get_db(), request.json or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except sqlite3.Error as e:
+        return jsonify({'error': f'Error updating jobs: {str(e)}'}), 400
+    
+    return jsonify({'updated': updated, 'message': f'{updated} jobs updated successfully'})
+
+def jobs_export_filter(args):
+    """WHERE fragment and params for a jobs export (area, status, start date range)
+
+    Raises ValueError on malformed date arguments.
+    """
+    area = args.get('area', 'all')
+    status = args.get('status', 'all')
+    where, params = date_range_filter('startDate', date_range_from_args(args))
+    if area != 'all':
+        where += ' AND area = ?'
+        params.append(area)
+    if status != 'all':
+        where += ' AND status = ?'
+        params.append(status)
+    return where, params
+
+def jobs_export_filename(args):
+    """Download name for a jobs export"""
+    area = secure_filename(args.get('area', 'all')) or 'all'
+    return f'jobs_export_{area}_{datetime.now().strftime("%Y%m%d")}.csv'
+
+@app.route('/api/jobs/export', methods=['GET'])
+def export_jobs():
+    """Stream jobs as CSV, optionally filtered by area, status and start date range"""
+    try:
+        where, params = jobs_export_filter(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    output = StringIO()
-    writer = csv.DictWriter(output, fieldnames=jobs[0].keys())
-    writer.writeheader()
-    writer.writerows(jobs)
+    conn = get_db()
+    if not conn.execute(f'SELECT 1 FROM jobs WHERE 1=1 {where} LIMIT 1', params).fetchone():
+        return jsonify({'error': 'No jobs to export'}), 404
     
-    from flask import make_response
-    response = make_response(output.getvalue())
-    response.headers['Content-Type'] = 'text/csv'
-    response.headers['Content-Disposition'] = f'attachment; filename=jobs_export_{area}_{datetime.now().strftime("%Y%m%d")}.csv'
+    sql = f'SELECT * FROM jobs WHERE 1=1 {where} ORDER BY createdAt DESC, id DESC'
+    response = Response(stream_csv(sql, params), mimetype='text/csv')
+    filename = jobs_export_filename(request.args)
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
     return response
 
 # API Routes - Vehicles
 @app.route('/api/vehicles', methods=['GET'])
+@conditional_on('vehicles')
 def get_vehicles():
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute('SELECT * FROM vehicles ORDER BY registration')
     vehicles = [dict(row) for row in cursor.fetchall()]
-    conn.close()
     return jsonify(vehicles)
 
 @app.route('/api/vehicles', methods=['POST'])
 def create_vehicle():
     data = request.json
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
     try:
         cursor.execute('''
@@ -1355,22 +2447,21 @@ def create_vehicle():
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
             data['registration'].upper(), data.get('vehicleType', 'car'), data['ownerName'], data['insuranceName'],
-            data.get('motDue'), data['taxDue'], data.get('tachoDue'), data['insuranceDue'], data.get('maintenanceDue'),
+            normalize_date(data.get('motDue')), normalize_date(data['taxDue']), normalize_date(data.get('tachoDue')),
+            normalize_date(data['insuranceDue']), normalize_date(data.get('maintenanceDue')),
             data.get('motActioned', False), data.get('taxActioned', False), 
             data.get('tachoActioned', False), data.get('insuranceActioned', False), data.get('maintenanceActioned', False)
         ))
         conn.commit()
         vehicle_id = cursor.lastrowid
-        conn.close()
         return jsonify({'id': vehicle_id, 'message': 'Vehicle created successfully'}), 201
     except sqlite3.IntegrityError:
-        conn.close()
         return jsonify({'error': 'Registration number already exists'}), 400
 
 @app.route('/api/vehicles/<int:vehicle_id>', methods=['PUT'])
 def update_vehicle(vehicle_id):
     data = request.json
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute('''
         UPDATE vehicles 
@@ -1380,22 +2471,28 @@ def update_vehicle(vehicle_id):
         WHERE id=?
     ''', (
         data['registration'].upper(), data.get('vehicleType', 'car'), data['ownerName'], data['insuranceName'],
-        data.get('motDue'), data['taxDue'], data.get('tachoDue'), data['insuranceDue'], data.get('maintenanceDue'),
+        normalize_date(data.get('motDue')), normalize_date(data['taxDue']), normalize_date(data.get('tachoDue')),
+        normalize_date(data['insuranceDue']), normalize_date(data.get('maintenanceDue')),
         data.get('motActioned', False), data.get('taxActioned', False),
         data.get('tachoActioned', False), data.get('insuranceActioned', False), 
         data.get('maintenanceActioned', False), vehicle_id
     ))
     conn.commit()
-    conn.close()
     return jsonify({'message': 'Vehicle updated successfully'})
 
+@app.route('/api/vehicles/<int:vehicle_id>', methods=['PATCH'])
+def patch_vehicle(vehicle_id):
+    data = request.json
+    if isinstance(data, dict) and data.get('registration'):
+        data['registration'] = data['registration'].upper()
+    return patch_row('vehicles', vehicle_id, data)
+
 @app.route('/api/vehicles/<int:vehicle_id>', methods=['DELETE'])
 def delete_vehicle(vehicle_id):
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db()
     cursor = conn.cursor()
     cursor.execute('DELETE FROM vehicles WHERE id=?', (vehicle_id,))
     conn.commit()
-    conn.close()
     return jsonify({'message': 'Vehicle deleted successfully'})
 
 # Serve the HTML interface
@@ -1403,24 +2500,385 @@ def delete_vehicle(vehicle_id):
 def index():
     return send_from_directory('.', 'complete_scaffolding_dashboard.html')
 
-def open_browser():
+# ============================================================================
+# BACKGROUND TASKS
+# ============================================================================
+
+TASK_RESULT_FOLDER = os.path.join(os.path.expanduser('~'), 'scaffolding_tasks')
+TASK_WORKERS = 2  # kept small so interactive requests stay responsive while tasks run
+TASK_RETENTION_DAYS = 7
+TASK_PROGRESS_INTERVAL = 0.5  # seconds between progress writes to the tasks table
+TASK_FINISHED_STATES = ('completed', 'failed', 'cancelled')
+
+if not os.path.exists(TASK_RESULT_FOLDER):
+    os.makedirs(TASK_RESULT_FOLDER)
+
+_task_executor = ThreadPoolExecutor(max_workers=TASK_WORKERS, thread_name_prefix='task')
+_task_futures = {}
+_task_cancelled = set()
+_task_lock = threading.Lock()
+
+class TaskCancelled(Exception):
+    """Raised inside a task when cancellation has been requested"""
+
+class TaskContext:
+    """Handed to task handlers for progress reporting, cancellation checks and output files"""
+    def __init__(self, task_id, params):
+        self.task_id = task_id
+        self.params = params
+        self._last_write = 0
+    
+    def checkpoint(self, progress=None, message=None):
+        """Record progress (0-1) and stop here if the task was cancelled"""
+        with _task_lock:
+            cancelled = self.task_id in _task_cancelled
+        if cancelled:
+            raise TaskCancelled()
+        now = time.monotonic()
+        if now - self._last_write >= TASK_PROGRESS_INTERVAL:
+            self._last_write = now
+            _update_task(self.task_id, progress=progress, message=message)
+        time.sleep(0)  # give request threads a turn at the GIL
+    
+    def result_path(self, extension):
+        """Where this task should write its output file"""
+        return os.path.join(TASK_RESULT_FOLDER, f'{self.task_id}.{extension}')
+
+def _update_task(task_id, **fields):
+    """Write the given (non-None) fields to a task row"""
+    fields = {key: value for key, value in fields.items() if value is not None}
+    if not fields:
+        return
+    assignments = ', '.join(f'{key}=?' for key in fields)
+    with db_connection() as conn:
+        conn.execute(f'UPDATE tasks SET {assignments} WHERE id=?', list(fields.values()) + [task_id])
+        conn.commit()
+
+def _task_write_chunks(ctx, path, chunks):
+    """Write streamed text output to a result file, checking for cancellation per chunk"""
+    written = 0
+    with open(path, 'w', encoding='utf-8', newline='') as out:
+        for chunk in chunks:
+            out.write(chunk)
+            written += len(chunk)
+            ctx.checkpoint(message=f'{written // 1024:,} KB written')
+
+def task_financial_report(ctx):
+    """Financial report for start_date..end_date as a CSV or NDJSON file"""
+    params = ctx.params
+    report_format = params.get('format', 'csv')
+    if report_format not in ('csv', 'ndjson'):
+        raise ValueError('format must be csv or ndjson')
+    if not params.get('start_date') or not params.get('end_date'):
+        raise ValueError('Start date and end date required')
+    date_range = date_range_from_args({'start_date': params['start_date'], 'end_date': params['end_date']})
+    date_filter, date_params = date_range_filter('date', date_range)
+    start_filter, start_params = date_range_filter('startDate', date_range)
+    
+    with db_connection() as conn:
+        totals = _report_totals(conn.cursor(), date_filter, date_params, start_filter, start_params)
+    if report_format == 'csv':
+        chunks = _stream_report_csv(totals, date_filter, date_params, start_filter, start_params)
+    else:
+        period = {'start': params['start_date'], 'end': params['end_date']}
+        chunks = _stream_report_ndjson(
+            period, totals,
+            f'SELECT * FROM transactions WHERE 1=1 {date_filter} ORDER BY date DESC, transactionType',
+            date_params,
+            f"SELECT * FROM jobs WHERE status = 'completed' {start_filter} ORDER BY startDate DESC",
+            start_params)
+    _task_write_chunks(ctx, ctx.result_path(report_format), chunks)
+    name = f'financial_report_{date_range[0]}_{normalize_date(params["end_date"])}.{report_format}'
+    return {'totals': totals}, name
+
+def task_export_jobs(ctx):
+    """Jobs CSV export (area, status and date range filters as for /api/jobs/export)"""
+    where, params = jobs_export_filter(ctx.params)
+    sql = f'SELECT * FROM jobs WHERE 1=1 {where} ORDER BY createdAt DESC, id DESC'
+    _task_write_chunks(ctx, ctx.result_path('csv'), stream_csv(sql, params))
+    return None, jobs_export_filename(ctx.params)
+
+def task_export_invoices(ctx):
+    """Invoice batch export (ids or date range; format xlsx or zip)"""
+    export_format = ctx.params.get('format', 'xlsx')
+    if export_format not in ('xlsx', 'zip'):
+        raise ValueError('format must be xlsx or zip')
+    with db_connection() as conn:
+        invoices = invoice_batch_from_args(conn, ctx.params)
+    if not invoices:
+        raise ValueError('No invoices to export')
+    ctx.checkpoint(0, f'Exporting {len(invoices)} invoices')
+    
+    path = ctx.result_path(export_format)
+    if export_format == 'zip':
+        with open(path, 'wb') as out:
+            for done, chunk in enumerate(stream_invoice_zip(invoices)):
+                out.write(chunk)
+                ctx.checkpoint(min(done / len(invoices), 1), f'{min(done, len(invoices))} of {len(invoices)} invoices')
+    else:
+        with open(path, 'wb') as out:
+            out.write(invoice_batch_workbook_bytes(invoices))
+    return {'invoices': len(invoices)}, f'invoices_{datetime.now().strftime("%Y%m%d")}.{export_format}'
+
+def task_bulk_update_jobs(ctx):
+    """Set-based job update, e.g. moving every job from one area to another"""
+    with db_connection() as conn:
+        updated = apply_job_bulk_update(conn, ctx.params)
+    return {'updated': updated}, None
+
+def task_import_jobs(ctx):
+    """Import jobs from CSV exports: the known files in the application folder, or every
+    .csv in params["directory"]; params["workers"] sets the parser processes. Rejected
+    or ambiguous date values are the downloadable result"""
+    import fixed_job_importer
+    directory = ctx.params.get('directory')
+    if directory and not os.path.isdir(directory):
+        raise ValueError(f'Not a folder: {directory}')
+    workers = int(ctx.params.get('workers') or fixed_job_importer.IMPORT_WORKERS)
+    ctx.checkpoint(0, 'Importing CSV files')
+    files = fixed_job_importer.find_import_files(directory)
+    rejects = []
+    inserted, updated, unchanged = fixed_job_importer.write_jobs(
+        fixed_job_importer.iter_jobs(files, workers, rejects),
+        progress=lambda done: ctx.checkpoint(message=f'{done} jobs staged'))
+    result = {'inserted': inserted, 'updated': updated, 'unchanged': unchanged, 'rejects': len(rejects)}
+    if not rejects:
+        return result, None
+    fixed_job_importer.write_rejects_report(rejects, ctx.result_path('csv'))
+    return result, f'import_rejects_{datetime.now().strftime("%Y%m%d")}.csv'
+
+TASK_HANDLERS = {
+    'financial-report': task_financial_report,
+    'export-jobs': task_export_jobs,
+    'export-invoices': task_export_invoices,
+    'bulk-update-jobs': task_bulk_update_jobs,
+    'import-jobs': task_import_jobs,
+}
+
+def _run_task(task_id, kind, params):
+    """Worker-thread body: run a handler and record how it ended"""
+    ctx = TaskContext(task_id, params)
+    try:
+        ctx.checkpoint()
+        _update_task(task_id, status='running', startedAt=datetime.now().isoformat(' ', 'seconds'))
+        result, download_name = TASK_HANDLERS[kind](ctx)
+        _update_task(task_id, status='completed', progress=1, message='Done',
+                     result=json.dumps(result) if result is not None else None,
+                     resultFile=download_name, finishedAt=datetime.now().isoformat(' ', 'seconds'))
+    except TaskCancelled:
+        _discard_task_files(task_id)
+        _update_task(task_id, status='cancelled', message='Cancelled',
+                     finishedAt=datetime.now().isoformat(' ', 'seconds'))
+    except Exception as e:
+        _discard_task_files(task_id)
+        _update_task(task_id, status='failed', error=str(e),
+                     finishedAt=datetime.now().isoformat(' ', 'seconds'))
+    finally:
+        with _task_lock:
+            _task_futures.pop(task_id, None)
+            _task_cancelled.discard(task_id)
+
+def _discard_task_files(task_id):
+    """Remove any output files a task wrote"""
+    for name in os.listdir(TASK_RESULT_FOLDER):
+        if name.split('.', 1)[0] == task_id:
+            os.remove(os.path.join(TASK_RESULT_FOLDER, name))
+
+def submit_task(kind, params):
+    """Record a task and queue it on the worker pool; returns the task id"""
+    task_id = secrets.token_hex(8)
+    with db_connection() as conn:
+        conn.execute('INSERT INTO tasks (id, kind, params) VALUES (?, ?, ?)',
+                     (task_id, kind, json.dumps(params)))
+        conn.commit()
+    with _task_lock:
+        _task_futures[task_id] = _task_executor.submit(_run_task, task_id, kind, params)
+    return task_id
+
+def _create_tasks_table(conn):
+    """Create the tasks table and tidy up after the previous run"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS tasks (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            params TEXT,
+            status TEXT NOT NULL DEFAULT 'queued',
+            progress REAL NOT NULL DEFAULT 0,
+            message TEXT,
+            result TEXT,
+            resultFile TEXT,
+            error TEXT,
+            createdAt TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            startedAt TIMESTAMP,
+            finishedAt TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        UPDATE tasks SET status = 'failed', error = 'Interrupted by a restart', finishedAt = CURRENT_TIMESTAMP
+        WHERE status IN ('queued', 'running')
+    ''')
+    expired = [row['id'] for row in conn.execute(
+        "SELECT id FROM tasks WHERE createdAt < datetime('now', ?)", (f'-{TASK_RETENTION_DAYS} days',))]
+    conn.executemany('DELETE FROM tasks WHERE id=?', [(task_id,) for task_id in expired])
+    conn.commit()
+    
+    known = {row['id'] for row in conn.execute("SELECT id FROM tasks WHERE status = 'completed'")}
+    for name in os.listdir(TASK_RESULT_FOLDER):
+        if name.split('.', 1)[0] not in known:
+            os.remove(os.path.join(TASK_RESULT_FOLDER, name))
+
+def task_to_dict(row):
+    """API representation of a task row"""
+    task = dict(row)
+    task['params'] = json.loads(task['params']) if task['params'] else {}
+    task['result'] = json.loads(task['result']) if task['result'] else None
+    task['download'] = f"/api/tasks/{task['id']}/download" if task.pop('resultFile') else None
+    return task
+
+@app.route('/api/tasks', methods=['POST'])
+def create_task():
+    """Queue a long operation; body {"kind": ..., "params": {...}}. Returns 202 with the task id"""
+    data = request.json or {}
+    kind = data.get('kind')
+    if kind not in TASK_HANDLERS:
+        return jsonify({'error': f'kind must be one of: {", ".join(sorted(TASK_HANDLERS))}'}), 400
+    params = data.get('params') or {}
+    if not isinstance(params, dict):
+        return jsonify({'error': 'params must be an object'}), 400
+    
+    task_id = submit_task(kind, params)
+    response = jsonify({'id': task_id, 'status': 'queued', 'url': f'/api/tasks/{task_id}'})
+    response.status_code = 202
+    response.headers['Location'] = f'/api/tasks/{task_id}'
+    return response
+
+@app.route('/api/tasks', methods=['GET'])
+def get_tasks():
+    """Most recent tasks, newest first"""
+    rows = get_db().execute('SELECT * FROM tasks ORDER BY createdAt DESC, rowid DESC LIMIT 50').fetchall()
+    return jsonify([task_to_dict(row) for row in rows])
+
+@app.route('/api/tasks/<task_id>', methods=['GET'])
+def get_task(task_id):
+    """Status, progress and (once completed) result of a task"""
+    row = get_db().execute('SELECT * FROM tasks WHERE id=?', (task_id,)).fetchone()
+    if not row:
+        return jsonify({'error': 'Task not found'}), 404
+    return jsonify(task_to_dict(row))
+
+@app.route('/api/tasks/<task_id>/download', methods=['GET'])
+def download_task_result(task_id):
+    """Download the file a completed task produced"""
+    row = get_db().execute('SELECT status, resultFile FROM tasks WHERE id=?', (task_id,)).fetchone()
+    if not row or row['status'] != 'completed' or not row['resultFile']:
+        return jsonify({'error': 'No result file for this task'}), 404
+    extension = row['resultFile'].rsplit('.', 1)[1]
+    try:
+        return send_from_directory(TASK_RESULT_FOLDER, f'{task_id}.{extension}', as_attachment=True,
+                                   download_name=row['resultFile'])
+    except NotFound:
+        return jsonify({'error': 'Result file has expired'}), 404
+
+@app.route('/api/tasks/<task_id>/cancel', methods=['POST'])
+def cancel_task(task_id):
+    """Cancel a queued or running task; running tasks stop at their next checkpoint"""
+    conn = get_db()
+    row = conn.execute('SELECT status FROM tasks WHERE id=?', (task_id,)).fetchone()
+    if not row:
+        return jsonify({'error': 'Task not found'}), 404
+    if row['status'] in TASK_FINISHED_STATES:
+        return jsonify({'error': f'Task already {row["status"]}'}), 409
+    
+    with _task_lock:
+        future = _task_futures.get(task_id)
+        _task_cancelled.add(task_id)
+    if future is not None and future.cancel():
+        # Never started, so _run_task won't record it
+        with _task_lock:
+            _task_futures.pop(task_id, None)
+            _task_cancelled.discard(task_id)
+        conn.execute("UPDATE tasks SET status='cancelled', message='Cancelled', finishedAt=CURRENT_TIMESTAMP "
+                     "WHERE id=?", (task_id,))
+        conn.commit()
+    return jsonify({'id': task_id, 'message': 'Cancellation requested'})
+
+# ============================================================================
+# SERVER
+# ============================================================================
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 5000
+SERVER_THREADS = 8  # worker threads in production mode
+SERVER_CONNECTION_LIMIT = 100  # open connections accepted before new ones wait
+SERVER_CHANNEL_TIMEOUT = 120  # seconds an idle or stalled connection is kept
+
+def parse_args(argv=None):
+    """Command line options for choosing and tuning the web server"""
+    import argparse
+    parser = argparse.ArgumentParser(description='Khalsa Scaffolding Business Manager')
+    parser.add_argument('--server', choices=['dev', 'production'], default='dev',
+                        help='dev: Flask development server; production: multi-threaded waitress server')
+    parser.add_argument('--host', default=DEFAULT_HOST,
+                        help=f'bind address (default {DEFAULT_HOST}; use 0.0.0.0 to serve other PCs)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f'port (default {DEFAULT_PORT})')
+    parser.add_argument('--threads', type=int, default=SERVER_THREADS,
+                        help=f'production worker threads (default {SERVER_THREADS})')
+    parser.add_argument('--connection-limit', type=int, default=SERVER_CONNECTION_LIMIT,
+                        help=f'production max open connections (default {SERVER_CONNECTION_LIMIT})')
+    parser.add_argument('--timeout', type=int, default=SERVER_CHANNEL_TIMEOUT,
+                        help=f'production idle/request timeout in seconds (default {SERVER_CHANNEL_TIMEOUT})')
+    parser.add_argument('--no-browser', action='store_true', help="don't open a browser window")
+    return parser.parse_args(argv)
+
+def create_production_server(host=DEFAULT_HOST, port=DEFAULT_PORT, threads=SERVER_THREADS,
+                             connection_limit=SERVER_CONNECTION_LIMIT, timeout=SERVER_CHANNEL_TIMEOUT):
+    """Build (but don't start) a waitress server for the app; raises ImportError without waitress"""
+    from waitress.server import create_server
+    # Keep one warm database connection per worker thread
+    _db_pool.maxsize = max(_db_pool.maxsize, threads)
+    return create_server(app, host=host, port=port, threads=threads,
+                         connection_limit=connection_limit, channel_timeout=timeout,
+                         ident='ScaffoldingManager')
+
+def open_browser(url='http://127.0.0.1:5000'):
     """Open the default browser after a short delay"""
-    import time
     time.sleep(1.5)
-    webbrowser.open('http://127.0.0.1:5000')
+    webbrowser.open(url)
 
 def main():
     """Main application entry point"""
+    args = parse_args()
     print("=" * 60)
     print("🏗️ KHALSA SCAFFOLDING - BUSINESS MANAGER V3")
     print("=" * 60)
     print()
     
     init_database()
+    with db_connection() as conn:
+        queue_missing_thumbnails(conn)
+    if Image is None:
+        print("💡 Install Pillow (pip install pillow) for receipt thumbnails")
     
+    server = None
+    if args.server == 'production':
+        try:
+            server = create_production_server(args.host, args.port, args.threads,
+                                              args.connection_limit, args.timeout)
+        except ImportError:
+            print("⚠️ waitress is not installed (pip install waitress); using the development server")
+    
+    browse_host = '127.0.0.1' if args.host in ('0.0.0.0', '::') else args.host
+    url = f'http://{browse_host}:{args.port}'
     print()
     print("🚀 Starting server...")
-    print("📍 Server will run at: http://127.0.0.1:5000")
+    print(f"📍 Server will run at: {url}")
+    if server:
+        print(f"🏭 Production server: {args.threads} threads, up to {args.connection_limit} "
+              f"connections, {args.timeout}s timeout")
+    else:
+        print("🧪 Development server (use --server production when several PCs share it)")
+    if args.host in ('0.0.0.0', '::'):
+        print(f"🌐 Listening on all network interfaces; other PCs use this PC's address and port {args.port}")
     print("🗄️ Database location:", DB_PATH)
     print("📁 Receipts folder:", UPLOAD_FOLDER)
     print("✨ NEW: Complete Financial Tracking System!")
@@ -1430,13 +2888,22 @@ def main():
     print("⚠️ Press Ctrl+C to stop the server")
     print()
     
-    threading.Thread(target=open_browser, daemon=True).start()
+    if not args.no_browser:
+        threading.Thread(target=open_browser, args=(url,), daemon=True).start()
     
     try:
-        app.run(host='127.0.0.1', port=5000, debug=False)
+        if server:
+            server.run()
+        else:
+            app.run(host=args.host, port=args.port, debug=False, threaded=True)
     except KeyboardInterrupt:
         print("\n\n👋 Server stopped. Goodbye!")
         sys.exit(0)
+    finally:
+        if server:
+            server.close()
+        close_all_connections()
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()  # the CSV importer's parser processes, in the packaged .exe
     main()